@@ -1,6 +1,9 @@
 import json
 import logging
+import os
 import shlex
+import stat
+import tempfile
 from dataclasses import asdict, dataclass, field
 from enum import Enum
 from pathlib import Path
@@ -20,6 +23,13 @@ from .env import (
     trace_config_filename,
 )
 
+try:
+    # orjson is an optional dependency that is significantly faster at encoding
+    # campaign files, which are rewritten on every modification
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
 logger = logging.getLogger("binrec.campaign")
 
 GET_TRACE_INPUT_FILES_FUNCTION = "get_trace_input_files"
@@ -116,6 +126,75 @@ class CampaignJsonEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+def _fast_dumps(obj: Any) -> bytes:
+    """
+    Encode an object to indented JSON, using orjson if it is available.
+
+    :param obj: the object to encode
+    :returns: the UTF-8 encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=CampaignJsonEncoder().default, option=orjson.OPT_INDENT_2
+        )
+    return json.dumps(obj, indent=2, cls=CampaignJsonEncoder).encode()
+
+
+def _get_umask() -> int:
+    """
+    :returns: the process's file mode creation mask
+    """
+    try:
+        # reading the umask from procfs does not modify it, unlike os.umask(), so it is
+        # safe to call while other threads create files
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:  # pragma: no cover
+        pass
+
+    umask = os.umask(0o022)  # pragma: no cover
+    os.umask(umask)  # pragma: no cover
+    return umask  # pragma: no cover
+
+
+def _write_file_atomic(filename: Path, content: bytes) -> None:
+    """
+    Write a file by first writing the content to a temporary file in the same
+    directory and then replacing the destination file. Concurrent readers see either
+    the previous or the new content, never a partially written file.
+
+    If the destination is a symlink, the file it points to is replaced and the symlink
+    is preserved. The replaced file keeps the permission bits of the previous file, or
+    is created with the default permissions (``0o666`` minus the umask), like
+    :func:`open`. The file's owner and any other metadata are not preserved.
+
+    :param filename: the destination filename
+    :param content: the file content
+    """
+    filename = Path(os.path.realpath(filename))
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_get_umask()
+
+    # the temporary file name is unique, so concurrent writers within the same process
+    # (e.g.- threads of the web app) do not write to each other's temporary file
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=f".{filename.name}.", suffix=".tmp", dir=filename.parent
+    )
+    tmp_filename = Path(tmp_name)
+    try:
+        with open(fd, "wb") as file:
+            os.fchmod(file.fileno(), mode)
+            file.write(content)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        tmp_filename.unlink(missing_ok=True)
+        raise
+
+
 class TraceArgType(Enum):
     """
     A trace argument type: symbolic or concrete.
@@ -472,6 +551,18 @@ class TraceParams:
                 link = dirname / item.source.name
                 link.symlink_to(item.source)
 
+    def check_input_files(self, resolve_root: Path = None) -> None:
+        """
+        Verify that every input file can be opened for reading, optionally resolving
+        relative source paths against ``resolve_root``. See
+        :meth:`TraceInputFile.check_source` for more information.
+
+        :param resolve_root: root path to resolve relative source paths against
+        :raises OSError: an input file does not exist or cannot be read
+        """
+        for input_file in self.input_files:
+            input_file.check_source(resolve_root)
+
     @classmethod
     def create_trace_args(
         cls, args: List[str], symbolic_indexes: List[int]
@@ -527,6 +618,19 @@ class Campaign:
         if not self.project:
             self.project = self.binary.name if self.binary else ""
 
+    def find_trace_index(self, name: str) -> Optional[int]:
+        """
+        Find the index of the first trace with the given name.
+
+        :param name: the trace name
+        :returns: the trace index, or ``None`` if no trace has the name
+        """
+        for i, trace in enumerate(self.traces):
+            if trace.name == name:
+                return i
+
+        return None
+
     def save(self, file: Union[str, Path, TextIO] = None) -> None:
         """
         Save the campaign to disk. The ``file`` argument can be one of:
@@ -541,17 +645,17 @@ class Campaign:
         if file is None:
             file = campaign_filename(self.project)
 
-        if isinstance(file, (str, Path)):
-            fp: TextIO = open(file, "w")
-        else:
-            fp = file
-
         body = asdict(self)
         # remove "binary" from the JSON since we want the campaign to be reusable by
         # being decoupled from the S2E project
         body.pop("binary", None)
         body.pop("project", None)
-        fp.write(json.dumps(body, indent=2, cls=CampaignJsonEncoder))
+        content = _fast_dumps(body)
+
+        if isinstance(file, (str, Path)):
+            _write_file_atomic(Path(file), content)
+        else:
+            file.write(content.decode())
 
     def remove_trace(self, name_or_id: Union[str, int]) -> None:
         """
@@ -569,11 +673,8 @@ class Campaign:
             self.traces.pop(name_or_id)
             return
 
-        for i, trace in enumerate(self.traces):
-            if trace.name == name_or_id:
-                found = i
-                break
-        else:
+        found = self.find_trace_index(name_or_id)
+        if found is None:
             raise KeyError(f"trace does not exist: {name_or_id}")
 
         self.traces.pop(found)
@@ -593,11 +694,11 @@ class Campaign:
                 raise IndexError(f"invalid trace index: {name_or_id}")
             return self.traces[name_or_id]
 
-        for trace in self.traces:
-            if trace.name == name_or_id:
-                return trace
+        index = self.find_trace_index(name_or_id)
+        if index is None:
+            raise KeyError(f"trace does not exist: {name_or_id}")
 
-        raise KeyError(f"trace does not exist: {name_or_id}")
+        return self.traces[index]
 
     @classmethod
     def load_project(cls, project_name: str, **kwargs) -> "Campaign":
@@ -635,7 +736,8 @@ class Campaign:
             ``filename`` (e.g.- ``input_file.check_source(filename.parent))``). See
             :meth:`TraceInputFile.check_source` for more information.
         """
-        with open(filename, "r") as file:
+        # campaign files are always UTF-8 encoded (see save())
+        with open(filename, "r", encoding="utf-8") as file:
             body = json.loads(file.read().strip())
 
         _validate_campaign_file(body)
@@ -651,8 +753,7 @@ class Campaign:
 
         if resolve_input_files:  # TODO unit test this
             for trace in campaign.traces:
-                for input_file in trace.input_files:
-                    input_file.check_source(filename.parent)
+                trace.check_input_files(filename.parent)
 
         return campaign
 
@@ -1,13 +1,31 @@
 import errno
-import json
+import io
 import logging
 import os
 import re
 import shutil
+import stat
+import string
 import subprocess
+import sys
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 from binrec.campaign import (
     Campaign,
@@ -29,8 +47,120 @@ from .env import (
 )
 from .errors import BinRecError
 
+if TYPE_CHECKING:  # pragma: no cover
+    # argparse is only imported when running the command line interface
+    import argparse
+
+try:
+    # orjson is an optional dependency that is significantly faster at decoding the
+    # potentially large output of "s2e info"
+    import orjson as _json
+except ImportError:  # pragma: no cover
+    import json as _json  # type: ignore
+
 logger = logging.getLogger("binrec.project")
 
+#: The maximum number of trace directories to delete concurrently
+CLEAR_TRACE_DATA_JOBS = 8
+
+#: Appended to a new project's S2E configuration to load the binrec plugins and map
+#: the input files directory into the analysis VM
+S2E_CONFIG_TEMPLATE = string.Template(
+    """
+add_plugin("ELFSelector")
+add_plugin("FunctionMonitor")
+add_plugin("FunctionLog")
+add_plugin("ExportELF")
+pluginsConfig.ExportELF = {
+    baseDirs = {
+        "${project_path}"
+    },
+    exportInterval = 1000 -- export every 1000 basic blocks
+}
+
+table.insert(pluginsConfig.HostFiles.baseDirs, "${input_files}")
+"""
+)
+
+#: Campaigns loaded within this process, keyed by ``(project, resolve_input_files)``.
+#: Each entry stores the campaign file's version (see :func:`_campaign_file_version`)
+#: at the time it was loaded so that stale entries are detected and reloaded. Cached
+#: campaigns are private: callers always receive a copy, so modifying a returned
+#: campaign, or any trace within it, never modifies the cache.
+_campaign_cache: Dict[Tuple[str, bool], Tuple[Tuple[int, int, int], Campaign]] = {}
+
+
+def _campaign_file_version(project: str) -> Tuple[int, int, int]:
+    """
+    :returns: the ``(inode, size, mtime_ns)`` of the project's campaign file. Campaign
+        files are saved atomically by replacing the file, so each save changes the
+        inode even when the filesystem's timestamps are too coarse to differ.
+    :raises OSError: the campaign file cannot be accessed
+    """
+    st = os.stat(campaign_filename(project))
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _load_project_cached(project: str, resolve_input_files: bool = True) -> Campaign:
+    """
+    Load a project's campaign, reusing a previously loaded campaign if the campaign
+    file has not been modified since it was loaded.
+
+    :param project: the project name
+    :param resolve_input_files: resolve input files (see :meth:`Campaign.load_json`)
+    :returns: the loaded campaign, which the caller is free to modify
+    """
+    key = (project, resolve_input_files)
+    try:
+        version = _campaign_file_version(project)
+    except OSError:
+        # let Campaign.load_project raise the appropriate error, if any
+        _campaign_cache.pop(key, None)
+        return Campaign.load_project(project, resolve_input_files=resolve_input_files)
+
+    cached = _campaign_cache.get(key)
+    if cached and cached[0] == version:
+        return deepcopy(cached[1])
+
+    campaign = Campaign.load_project(project, resolve_input_files=resolve_input_files)
+    _campaign_cache[key] = (version, deepcopy(campaign))
+    return campaign
+
+
+def _invalidate(project: str) -> None:
+    """
+    Drop all cached campaigns for a project. This must be called after a campaign has
+    been modified and saved.
+
+    :param project: the project name
+    """
+    for key in [key for key in _campaign_cache if key[0] == project]:
+        del _campaign_cache[key]
+
+
+def _cache_saved_campaign(
+    project: str, resolve_input_files: bool, campaign: Campaign
+) -> None:
+    """
+    Cache a campaign that was just saved to the project's campaign file, so that the
+    next load reuses it rather than parsing the file that was just written. All other
+    cached campaigns for the project are dropped.
+
+    :param project: the project name
+    :param resolve_input_files: whether the campaign's input files were resolved when
+        it was loaded (see :meth:`Campaign.load_json`)
+    :param campaign: the saved campaign
+    """
+    _invalidate(project)
+    try:
+        version = _campaign_file_version(project)
+    except OSError:
+        return
+
+    # the caller keeps using the saved campaign (and the traces returned by the
+    # modification functions), so cache a copy that is detached from them
+    _campaign_cache[(project, resolve_input_files)] = (version, deepcopy(campaign))
+
 
 def listing() -> List[str]:
     try:
@@ -38,7 +168,7 @@ def listing() -> List[str]:
     except subprocess.CalledProcessError:
         raise BinRecError("s2e run failed to get project list")
 
-    d = json.loads(output)
+    d = _json.loads(output)
     return d["projects"].keys()
 
 
@@ -47,8 +177,43 @@ def _list() -> None:
         print(proj)
 
 
+@contextmanager
+def campaign_transaction(
+    project: str, resolve_input_files: bool = False
+) -> Iterator[Campaign]:
+    """
+    Load a project's campaign for modification. The campaign is saved once, when the
+    context exits without raising an exception, which allows multiple modifications
+    to be made without rewriting the campaign file after each one. The saved campaign
+    is cached, so consecutive transactions do not reparse the campaign file:
+
+    .. code-block:: python
+
+        with campaign_transaction("myproject") as campaign:
+            add_trace_setup("myproject", "tr1", "touch x", campaign=campaign)
+            add_trace_teardown("myproject", "tr1", "rm x", campaign=campaign)
+
+    :param project: the project name
+    :param resolve_input_files: resolve input files (see :meth:`Campaign.load_json`)
+    """
+    campaign = _load_project_cached(project, resolve_input_files=resolve_input_files)
+    try:
+        yield campaign
+        campaign.save()
+    except BaseException:
+        # the cached campaign may have been partially modified or was not saved
+        _invalidate(project)
+        raise
+
+    _cache_saved_campaign(project, resolve_input_files, campaign)
+
+
 def add_campaign_trace(
-    project: str, args: List[str], symbolic_indexes: List[int] = None, name: str = None
+    project: str,
+    args: List[str],
+    symbolic_indexes: List[int] = None,
+    name: str = None,
+    campaign: Campaign = None,
 ) -> TraceParams:
     """
     Add a new trace to an existing campaign.
@@ -57,11 +222,16 @@ def add_campaign_trace(
     :param args: the full command line arguments, including concrete and symbolic
     :param symbolic_indexes: the list of argument indexes in ``args`` that are symbolic
     :param name: the new trace name
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return add_campaign_trace(project, args, symbolic_indexes, name, campaign)
+
     trace_args = TraceParams.create_trace_args(args, symbolic_indexes or [])
     params = TraceParams(trace_args, name=name)
 
-    campaign = Campaign.load_project(project, resolve_input_files=False)
     logger.info(
         "adding new trace to campaign %s: %s (symbolic args: %s)",
         project,
@@ -70,8 +240,6 @@ def add_campaign_trace(
     )
     campaign.traces.append(params)
 
-    campaign.save()
-
     return params
 
 
@@ -85,52 +253,73 @@ def _resolve_trace_name_or_id(
     :returns: a tuple of ``(trace_id, trace)``
     :raises KeyError: the trace does not exist within the campaign
     """
-    try:
-        trace_id = int(name_or_id)
+    trace_id: Optional[int]
+    if isinstance(name_or_id, int):
+        # an explicit trace id (``--id`` on the command line): index directly
+        trace_id = name_or_id
+    else:
+        # only numeric strings are treated as trace ids; checking the characters is
+        # much cheaper than raising and catching a ValueError for every trace name
+        digits = name_or_id[1:] if name_or_id.startswith("-") else name_or_id
+        trace_id = int(name_or_id) if digits.isdecimal() else None
+
+    if trace_id is not None:
         if trace_id < 0:
             trace_id = len(campaign.traces) + trace_id
 
         if trace_id >= 0 and trace_id < len(campaign.traces):
             return trace_id, campaign.traces[trace_id]
-    except ValueError:
-        pass
 
-    for trace_id, trace in enumerate(campaign.traces):
-        if trace.name and trace.name == name_or_id:
-            return trace_id, trace
+    if isinstance(name_or_id, str):
+        index = campaign.find_trace_index(name_or_id)
+        if index is not None:
+            return index, campaign.traces[index]
 
     raise KeyError(f"trace does not exist: {name_or_id}")
 
 
-def remove_campaign_trace(project: str, name_or_id: Union[str, int]) -> None:
+def remove_campaign_trace(
+    project: str, name_or_id: Union[str, int], campaign: Campaign = None
+) -> None:
     """
     Remove a trace from an existing campaign.
 
     :param project: project name
     :param name_or_id: trace name or id (see :meth:`Campaign.remove_trace`
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project, resolve_input_files=False)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return remove_campaign_trace(project, name_or_id, campaign)
 
     trace_id, trace = _resolve_trace_name_or_id(campaign, name_or_id)
 
     logger.info("removing trace %s/%s", project, trace.name or trace_id)
     campaign.remove_trace(trace_id)
-    campaign.save()
 
 
-def remove_campaign_all_traces(project: str) -> None:
+def remove_campaign_all_traces(project: str, campaign: Campaign = None) -> None:
     """
     Remove all traces from an existing campaign.
+
+    :param project: project name
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project, resolve_input_files=False)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return remove_campaign_all_traces(project, campaign)
 
     logger.info("removing all traces from campaign: %s", project)
     campaign.traces = []
-    campaign.save()
 
 
 def set_trace_stdin(
-    project: str, trace_name_or_id: Union[str, int], stdin: str
+    project: str,
+    trace_name_or_id: Union[str, int],
+    stdin: str,
+    campaign: Campaign = None,
 ) -> None:
     """
     Set the stdin content for a single trace.
@@ -138,12 +327,16 @@ def set_trace_stdin(
     :param project: project name
     :param trace_name_or_id: the existing trace name or id
     :param stdin: stdin content
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project, resolve_input_files=False)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return set_trace_stdin(project, trace_name_or_id, stdin, campaign)
+
     trace_id, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
     trace.stdin = stdin
     logger.info("setting stdin content for %s/%s", project, trace.name or trace_id)
-    campaign.save()
 
 
 def add_trace_input_file(
@@ -152,6 +345,7 @@ def add_trace_input_file(
     source: Path,
     destination: Path = None,
     permissions: Union[str, bool] = None,
+    campaign: Campaign = None,
 ) -> None:
     """
     Add a new trace input file to an existing trace.
@@ -159,13 +353,24 @@ def add_trace_input_file(
     :param project: project name
     :param trace_name_or_id: the existing trace name or id
     :param source: source input file on the host filesystem
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project, resolve_input_files=False)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return add_trace_input_file(
+                project, trace_name_or_id, source, destination, permissions, campaign
+            )
+
     trace_id, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
 
-    with open(source, "r") as _:
-        # Verify that the file exists and we can read it
-        pass
+    # Verify that the file exists and we can read it, without the overhead of actually
+    # opening the file (os.stat raises FileNotFoundError if it does not exist)
+    if stat.S_ISDIR(os.stat(source).st_mode):
+        raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), str(source))
+
+    if not os.access(source, os.R_OK):
+        raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), str(source))
 
     if permissions in (None, ""):
         chmod = True  # default behavior: copy source file permissions
@@ -181,11 +386,13 @@ def add_trace_input_file(
         input_file.source,
         destination or f"./input_files/{input_file.source.name}",
     )
-    campaign.save()
 
 
 def remove_trace_input_file(
-    project: str, trace_name_or_id: Union[int, str], filename: Path
+    project: str,
+    trace_name_or_id: Union[int, str],
+    filename: Path,
+    campaign: Campaign = None,
 ) -> None:
     """
     Remove an input file from a trace. The ``filename`` parameter can either be the
@@ -194,10 +401,17 @@ def remove_trace_input_file(
     :param project: project name
     :param trace_name_or_id: trace name or id
     :param filename: filename or path to remove
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     :raises KeyError: the input file does not exist
     """
-    basename = filename.name if "/" not in str(filename) else None
-    campaign = Campaign.load_project(project, resolve_input_files=False)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return remove_trace_input_file(
+                project, trace_name_or_id, filename, campaign
+            )
+
+    basename = filename.name if len(filename.parts) == 1 else None
     trace_id, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
 
     for input_file in trace.input_files:
@@ -216,7 +430,6 @@ def remove_trace_input_file(
         found.source,
     )
     trace.input_files.remove(found)
-    campaign.save()
 
 
 def _link_lifted_input_files(project_name: str) -> None:
@@ -231,6 +444,23 @@ def _link_lifted_input_files(project_name: str) -> None:
         dest.symlink_to(source)
 
 
+def _run_bash_script(lines: List[str], cwd: Path) -> None:
+    """
+    Execute a bash script. The script lines are written to an anonymous in-memory
+    file, which is passed to bash as stdin, so that the script does not have to be
+    joined and encoded into a single buffer and then piped to bash.
+
+    :param lines: the script lines
+    :param cwd: the current working directory to execute the script from
+    """
+    with open(os.memfd_create("binrec-script"), "w+b") as script:
+        for line in lines:
+            script.write(line.encode())
+            script.write(b"\n")
+        script.seek(0)
+        subprocess.run(["/bin/bash", "--noprofile"], stdin=script, cwd=str(cwd))
+
+
 def _run_trace_setup(campaign: Campaign, trace: TraceParams, cwd: Path) -> None:
     """
     Run the trace setup actions for a given campaign and trace. If the trace does not
@@ -245,8 +475,7 @@ def _run_trace_setup(campaign: Campaign, trace: TraceParams, cwd: Path) -> None:
         return
 
     logger.info("running setup actions")
-    script = "\n".join(setup)
-    subprocess.run(["/bin/bash", "--noprofile"], input=script.encode(), cwd=str(cwd))
+    _run_bash_script(setup, cwd)
     logger.info("setup actions completed")
 
 
@@ -264,8 +493,7 @@ def _run_trace_teardown(campaign: Campaign, trace: TraceParams, cwd: Path) -> No
         return
 
     logger.info("running teardown actions")
-    script = "\n".join(teardown)
-    subprocess.run(["/bin/bash", "--noprofile"], input=script.encode(), cwd=str(cwd))
+    _run_bash_script(teardown, cwd)
     logger.info("teardown actions completed")
 
 
@@ -294,8 +522,10 @@ def run_campaign_trace(project: str, trace_name_or_id: Union[int, str]) -> None:
     :param trace_name_or_id: the trace name or id to run (see
         :meth:`Campaign.get_trace`)
     """
-    campaign = Campaign.load_project(project)
+    # only the input files of the trace being run need to be resolved
+    campaign = Campaign.load_project(project, resolve_input_files=False)
     _, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
+    trace.check_input_files(campaign_filename(project).parent)
     _run_campaign_trace(campaign, trace)
 
 
@@ -316,10 +546,13 @@ def _run_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
         trace.name or "<anonymous trace>",
         logfile,
     )
+    # S2E writes directly to the log file descriptor, which is always closed, even
+    # when S2E fails
+    log_fd = os.open(logfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     try:
         subprocess.check_call(
             ["s2e", "run", "--no-tui", campaign.project],
-            stdout=logfile.open("w"),
+            stdout=log_fd,
             stderr=subprocess.STDOUT,
         )
     except subprocess.CalledProcessError:
@@ -327,17 +560,21 @@ def _run_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
             f"s2e run failed for project: {campaign.project}, for more information "
             f"view the log file at {logfile}"
         )
+    finally:
+        os.close(log_fd)
 
 
 def _get_next_trace_log_filename(project: str) -> Path:
     """
-    Get the next log file name prior to running a trace.
+    Get the next log file name prior to running a trace. The log number matches the
+    trace directory that S2E will create, which is the lowest number that does not
+    have an existing trace directory.
     """
-    trace_nums = []
+    trace_nums = set()
     for entry in get_trace_dirs(project):
         try:
             number = int(entry.name.split("-")[-1])
-            trace_nums.append(number)
+            trace_nums.add(number)
         except ValueError:
             pass
 
@@ -348,11 +585,17 @@ def _get_next_trace_log_filename(project: str) -> Path:
     return project_dir(project) / f"s2e-out-{i}.log"
 
 
-def validate_campaign(project_or_campaign: Union[str, Campaign]) -> None:
+def validate_campaign(project_or_campaign: Union[str, Campaign], jobs: int = 1) -> None:
     """
     Validate the lift results for an entire campaign.
 
+    Traces can be validated concurrently, by setting ``jobs`` to a value greater than
+    1, only when no trace has input files and the campaign does not have any setup or
+    teardown actions, since these are shared by all traces within the merged trace
+    directory. Otherwise, the traces are validated serially.
+
     :param project_or_campaign: the project name or the campaign object to validate
+    :param jobs: the maximum number of traces to validate concurrently
     """
     if isinstance(project_or_campaign, str):
         campaign = Campaign.load_project(project_or_campaign)
@@ -361,10 +604,59 @@ def validate_campaign(project_or_campaign: Union[str, Campaign]) -> None:
     else:
         raise TypeError("expected project name (str) or campaign object")
 
+    if jobs > 1 and len(campaign.traces) > 1:
+        if _can_validate_concurrently(campaign):
+            _validate_campaign_traces_concurrently(campaign, jobs)
+            return
+
+        logger.warning(
+            "campaign %s has input files or setup/teardown actions, validating "
+            "traces serially",
+            campaign.project,
+        )
+
     for trace in campaign.traces:
         _validate_campaign_trace(campaign, trace)
 
 
+def _can_validate_concurrently(campaign: Campaign) -> bool:
+    """
+    :returns: the campaign's traces do not share any state on the filesystem and can
+        be validated concurrently
+    """
+    if campaign.setup or campaign.teardown:
+        return False
+
+    return not any(
+        trace.input_files or trace.setup or trace.teardown for trace in campaign.traces
+    )
+
+
+def _validate_campaign_traces_concurrently(campaign: Campaign, jobs: int) -> None:
+    """
+    Validate all campaign traces concurrently.
+
+    :param campaign: the campaign, which must pass :func:`_can_validate_concurrently`
+    :param jobs: the maximum number of traces to validate concurrently
+    """
+    # None of the traces have input files, so the shared input files directory only
+    # needs to be prepared once
+    TraceParams().setup_input_file_directory(campaign.project)
+    _link_lifted_input_files(campaign.project)
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(campaign.traces))) as pool:
+        futures = [
+            pool.submit(
+                _validate_campaign_trace, campaign, trace, prepare_input_files=False
+            )
+            for trace in campaign.traces
+        ]
+
+        # raise the first error, in trace order
+        for future in futures:
+            future.result()
+
+
 def validate_campaign_trace(project: str, trace_name_or_id: Union[int, str]) -> None:
     """
     Validate the lift result of a single trace within a campaign.
@@ -373,8 +665,10 @@ def validate_campaign_trace(project: str, trace_name_or_id: Union[int, str]) ->
     :param  trace_name_or_id: the trace name or id to validate (see
         :meth:`Campaign.get_trace`)
     """
-    campaign = Campaign.load_project(project)
+    # only the input files of the trace being validated need to be resolved
+    campaign = Campaign.load_project(project, resolve_input_files=False)
     _, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
+    trace.check_input_files(campaign_filename(project).parent)
     _validate_campaign_trace(campaign, trace)
 
 
@@ -384,12 +678,25 @@ def validate_campaign_with_args(project: str, args: List[str]) -> None:
 
     :param args: the command line arguments to validate with
     """
-    campaign = Campaign.load_project(project)
+    campaign = Campaign.load_project(project, resolve_input_files=False)
     trace = TraceParams(args=[TraceArg(TraceArgType.concrete, arg) for arg in args])
     _validate_campaign_trace(campaign, trace)
 
 
-def _validate_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
+@lru_cache(maxsize=256)
+def _compile_output_pattern(pattern: str) -> Pattern[str]:
+    """
+    Compile a trace's ``match_stdout`` or ``match_stderr`` regex pattern. Compiled
+    patterns are cached since the same pattern is typically shared by many traces.
+    """
+    return re.compile(pattern)
+
+
+def _validate_campaign_trace(
+    campaign: Campaign,
+    trace: TraceParams,
+    prepare_input_files: bool = True,
+) -> None:
     """
     Compare the original binary against the lifted binary for a given sample of
     command line arguments. This method runs the original and the lifted binary
@@ -399,6 +706,8 @@ def _validate_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
 
     :param campaign: the campaign
     :param trace: the trace
+    :param prepare_input_files: link the trace's input files into the project's
+        input files directory
     """
     project = campaign.project
     logger.info(
@@ -408,69 +717,51 @@ def _validate_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
     merged_dir = merged_trace_dir(project)
     lifted = str(merged_dir / "recovered")
     original = str(merged_dir / "binary")
-    target_path = merged_dir / "test-target"
-    target = str(target_path)
-
-    if target_path.is_symlink():
-        target_path.unlink()
+    # Both binaries are executed with the same argv[0] to make sure that the original
+    # and the lifted program behave the same if they use it.
+    argv0 = str(merged_dir / "test-target")
 
-    # We link to the binary we are running to make sure argv[0] is the same
-    # for the original and the lifted program.
-    os.link(original, target)
-
-    trace.setup_input_file_directory(project)
-    _link_lifted_input_files(project)
+    if prepare_input_files:
+        trace.setup_input_file_directory(project)
+        _link_lifted_input_files(project)
 
     stdin_file = subprocess.PIPE if trace.stdin else subprocess.DEVNULL
+    stdin_content = trace.stdin.encode() if trace.stdin else None
 
     _run_trace_setup(campaign, trace, merged_dir)
     logger.debug(">> running original sample with args: %s", trace.command_line_args)
     original_proc = subprocess.Popen(
-        [target] + trace.command_line_args,
+        [argv0] + trace.command_line_args,
+        executable=original,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         stdin=stdin_file,
         cwd=str(merged_dir),
     )
 
-    if trace.stdin and original_proc.stdin:
-        original_proc.stdin.write(trace.stdin.encode())
-        original_proc.stdin.close()
-
-    original_proc.wait()
-    os.remove(target)
+    # communicate() drains stdout and stderr while the process is running so that the
+    # process cannot block on a full pipe
+    original_stdout, original_stderr = original_proc.communicate(stdin_content)
 
     _run_trace_teardown(campaign, trace, merged_dir)
 
-    original_stdout = original_proc.stdout.read()  # type: ignore
-    original_stderr = original_proc.stderr.read()  # type: ignore
-
-    os.link(lifted, target)
     _run_trace_setup(campaign, trace, merged_dir)
 
     logger.debug(">> running recovered sample with args: %s", trace.command_line_args)
 
     lifted_proc = subprocess.Popen(
-        [target] + trace.command_line_args,
+        [argv0] + trace.command_line_args,
+        executable=lifted,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         stdin=stdin_file,
         cwd=str(merged_dir),
     )
 
-    if trace.stdin and lifted_proc.stdin:
-        lifted_proc.stdin.write(trace.stdin.encode())
-        lifted_proc.stdin.close()
-
-    # Only close if stdin is a file / pipe (unsupported at this time)
-    lifted_proc.wait()
-    os.remove(target)
+    lifted_stdout, lifted_stderr = lifted_proc.communicate(stdin_content)
 
     _run_trace_teardown(campaign, trace, merged_dir)
 
-    lifted_stdout = lifted_proc.stdout.read()  # type: ignore
-    lifted_stderr = lifted_proc.stderr.read()  # type: ignore
-
     assert (
         original_proc.returncode == lifted_proc.returncode
     ), "recovered exit code does not match original"
@@ -481,7 +772,9 @@ def _validate_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
         ), "recovered stdout content does not match original"
     elif isinstance(trace.match_stdout, str):
         assert (
-            re.match(trace.match_stdout, lifted_stdout.decode(errors="replace"))
+            _compile_output_pattern(trace.match_stdout).match(
+                lifted_stdout.decode(errors="replace")
+            )
             is not None
         ), "regex pattern for stdout content does not match"
 
@@ -491,7 +784,9 @@ def _validate_campaign_trace(campaign: Campaign, trace: TraceParams) -> None:
         ), "recovered stderr content does not match original"
     elif isinstance(trace.match_stderr, str):
         assert (
-            re.match(trace.match_stderr, lifted_stderr.decode(errors="replace"))
+            _compile_output_pattern(trace.match_stderr).match(
+                lifted_stderr.decode(errors="replace")
+            )
             is not None
         ), "regex pattern for stderr content does not match"
 
@@ -549,24 +844,14 @@ def new_project(
     # directory to the analysis VM
     with open(s2e_config_filename(project_name), "a") as file:
         file.write(
-            f"""
-add_plugin(\"ELFSelector\")
-add_plugin(\"FunctionMonitor\")
-add_plugin(\"FunctionLog\")
-add_plugin(\"ExportELF\")
-pluginsConfig.ExportELF = {{
-    baseDirs = {{
-        "{project_path}"
-    }},
-    exportInterval = 1000 -- export every 1000 basic blocks
-}}
-
-table.insert(pluginsConfig.HostFiles.baseDirs, "{input_files}")
-"""
+            S2E_CONFIG_TEMPLATE.substitute(
+                project_path=project_path, input_files=input_files
+            )
         )
 
     patch_s2e_project(project_name)
     campaign.save()
+    _invalidate(project_name)
 
     return project_path
 
@@ -577,67 +862,75 @@ def describe_campaign(project_name: str) -> None:
 
     :param project_name: the project name
     """
-    campaign = Campaign.load_project(project_name)
-    print(campaign.project)
-    print("=" * len(campaign.project))
-    print("Campaign File:", campaign_filename(project_name))
-    print("Sample Binary:", campaign.binary)
+    # input files are only displayed, so there is no need to resolve them
+    campaign = Campaign.load_project(project_name, resolve_input_files=False)
+    # buffer the entire description and write it to stdout once, rather than paying
+    # the per-call overhead of print() for every line of a large campaign
+    buf = io.StringIO()
+    out = partial(print, file=buf)
+
+    out(campaign.project)
+    out("=" * len(campaign.project))
+    out("Campaign File:", campaign_filename(project_name))
+    out("Sample Binary:", campaign.binary)
     if campaign.setup:
-        print(f"Global Setup ({len(campaign.setup)}):")
+        out(f"Global Setup ({len(campaign.setup)}):")
         for line in campaign.setup:
-            print(" ", line)
-        print()
+            out(" ", line)
+        out()
 
     if campaign.teardown:
-        print(f"Global Teardown ({len(campaign.teardown)}):")
+        out(f"Global Teardown ({len(campaign.teardown)}):")
         for line in campaign.teardown:
-            print(" ", line)
-        print()
+            out(" ", line)
+        out()
 
-    print(f"Traces ({len(campaign.traces)}):")
+    out(f"Traces ({len(campaign.traces)}):")
     for index, trace in enumerate(campaign.traces):
         name = trace.name or "(anonymous trace)"
-        print(" ", name)
-        print(" ", "-" * len(name))
-        print("  Id:", index)
-        print("  Command Line Arguments:", trace.command_line_args)
-        print("  Symbolic Indexes:", ", ".join(str(i) for i in trace.symbolic_indexes))
+        out(" ", name)
+        out(" ", "-" * len(name))
+        out("  Id:", index)
+        out("  Command Line Arguments:", trace.command_line_args)
+        out("  Symbolic Indexes:", ", ".join(str(i) for i in trace.symbolic_indexes))
 
         if trace.input_files:
-            print(f"  Input Files ({len(trace.input_files)}):")
+            out(f"  Input Files ({len(trace.input_files)}):")
             for input_file in trace.input_files:
-                print("   ", input_file.source)
+                out("   ", input_file.source)
                 if input_file.destination:
-                    print("     ", "Destination:", input_file.destination)
+                    out("     ", "Destination:", input_file.destination)
                 if isinstance(input_file.permissions, bool):
                     if input_file.permissions:
-                        print("      [Preserve source permissions]")
+                        out("      [Preserve source permissions]")
                     else:
-                        print("      [Use default permissions]")
+                        out("      [Use default permissions]")
                 else:
-                    print(f"      [chmod {input_file.permissions}]")
+                    out(f"      [chmod {input_file.permissions}]")
 
         if trace.setup:
-            print(f"  Setup ({len(trace.setup)}):")
+            out(f"  Setup ({len(trace.setup)}):")
             for line in trace.setup:
-                print("   ", line)
-            print()
+                out("   ", line)
+            out()
         elif campaign.setup:
-            print("  [Inherit global setup]")
+            out("  [Inherit global setup]")
 
         if trace.teardown:
-            print(f"  Teardown ({len(trace.teardown)}):")
+            out(f"  Teardown ({len(trace.teardown)}):")
             for line in trace.teardown:
-                print("   ", line)
-            print()
+                out("   ", line)
+            out()
         elif campaign.teardown:
-            print("  [Inherit global teardown]")
+            out("  [Inherit global teardown]")
 
         if trace.stdin:
-            print("  stdin:")
-            print(textwrap.indent(trace.stdin, "    "))
+            out("  stdin:")
+            out(textwrap.indent(trace.stdin, "    "))
+
+        out()
 
-        print()
+    sys.stdout.write(buf.getvalue())
 
 
 def clear_project_trace_data(project: str) -> None:
@@ -645,18 +938,27 @@ def clear_project_trace_data(project: str) -> None:
     Delete all trace directories from the project.
     """
     logger.info("clearing trace directory for project: %s", project)
-    for dirname in get_trace_dirs(project):
+    dirnames = get_trace_dirs(project)
+    for dirname in dirnames:
         logger.debug("deleting trace directory: %s", dirname)
-        shutil.rmtree(dirname)
 
     merged = merged_trace_dir(project)
     if merged.is_dir():
         logger.debug("deleting merged trace directory: %s", merged)
-        shutil.rmtree(merged)
+        dirnames.append(merged)
+
+    # The directories are independent, delete them concurrently so that the
+    # filesystem operations of each directory overlap
+    with ThreadPoolExecutor(max_workers=CLEAR_TRACE_DATA_JOBS) as pool:
+        for _ in pool.map(shutil.rmtree, dirnames):
+            pass
 
 
 def add_trace_setup(
-    project: str, trace_name_or_id: Union[str, int], command: str
+    project: str,
+    trace_name_or_id: Union[str, int],
+    command: str,
+    campaign: Campaign = None,
 ) -> None:
     """
     Add a new setup command to an existing trace.
@@ -664,18 +966,40 @@ def add_trace_setup(
     :param project: project name
     :param trace_name_or_id: trace name or id
     :param command: bash command to execute during trace setup
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return add_trace_setup(project, trace_name_or_id, command, campaign)
+
     _, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
     logger.info(
         "adding new setup command to %s/%s: %s", project, trace_name_or_id, command
     )
     trace.setup.append(command)
-    campaign.save()
+
+
+def batch_add_trace_setup(
+    project: str, items: List[Tuple[Union[str, int], str]]
+) -> None:
+    """
+    Add multiple setup commands to existing traces. The campaign is loaded and saved
+    only once, regardless of the number of commands being added.
+
+    :param project: project name
+    :param items: list of ``(trace_name_or_id, command)`` tuples
+    """
+    with campaign_transaction(project) as campaign:
+        for trace_name_or_id, command in items:
+            add_trace_setup(project, trace_name_or_id, command, campaign)
 
 
 def add_trace_teardown(
-    project: str, trace_name_or_id: Union[str, int], command: str
+    project: str,
+    trace_name_or_id: Union[str, int],
+    command: str,
+    campaign: Campaign = None,
 ) -> None:
     """
     Add a new teardown command to an existing trace.
@@ -683,37 +1007,241 @@ def add_trace_teardown(
     :param project: project name
     :param trace_name_or_id: trace name or id
     :param command: bash command to execute during trace teardown
+    :param campaign: the loaded campaign to modify, which is not saved (see
+        :func:`campaign_transaction`)
     """
-    campaign = Campaign.load_project(project)
+    if campaign is None:
+        with campaign_transaction(project) as campaign:
+            return add_trace_teardown(project, trace_name_or_id, command, campaign)
+
     _, trace = _resolve_trace_name_or_id(campaign, trace_name_or_id)
     logger.info(
         "adding new teardown command to %s/%s: %s", project, trace_name_or_id, command
     )
     trace.teardown.append(command)
-    campaign.save()
 
 
-def main() -> None:
-    import argparse
+def apply_campaign_operations(project: str, operations: List[dict]) -> None:
+    """
+    Apply a list of operations to an existing campaign. The campaign is loaded once,
+    every operation is applied in order, and then the campaign is saved once. If any
+    operation fails, the campaign is not saved.
 
-    from .core import enable_binrec_debug_mode, init_binrec
+    Each operation is an object with an ``op`` key, which is the name of the
+    equivalent ``binrec.project`` command, and the command's arguments:
 
-    init_binrec()
+    .. code-block:: json
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-v", "--verbose", action="count", help="enable verbose logging"
+        [
+            {"op": "add-trace", "name": "tr1", "args": ["-a", "1"]},
+            {"op": "add-trace-setup", "name": "tr1", "command": "touch x"},
+            {"op": "add-trace-input-file", "name": 0, "source": "./x.txt"}
+        ]
+
+    Trace names that are integers are treated as trace ids.
+
+    :param project: project name
+    :param operations: list of operations to apply
+    :raises ValueError: the operations are invalid (see
+        :func:`_check_campaign_operations`), nothing is applied
+    """
+    _check_campaign_operations(operations)
+    with campaign_transaction(project) as campaign:
+        for operation in operations:
+            _apply_campaign_operation(campaign, operation)
+
+
+#: The keys required by each campaign operation (see
+#: :func:`apply_campaign_operations`), in addition to ``op``
+CAMPAIGN_OPERATION_REQUIRED_KEYS: Dict[str, Tuple[str, ...]] = {
+    "add-trace": (),
+    "remove-trace": ("name",),
+    "set-trace-stdin": ("name", "stdin"),
+    "add-trace-input-file": ("name", "source"),
+    "remove-trace-input-file": ("name", "source"),
+    "add-trace-setup": ("name", "command"),
+    "add-trace-teardown": ("name", "command"),
+}
+
+
+def _is_str(value: Any) -> bool:
+    return isinstance(value, str)
+
+
+def _is_trace_name_or_id(value: Any) -> bool:
+    # bool is a subclass of int, but "true" is not a trace id
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def _is_optional_str(value: Any) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def _is_permissions(value: Any) -> bool:
+    return value is None or isinstance(value, (str, bool))
+
+
+def _is_str_list(value: Any) -> bool:
+    return value is None or (
+        isinstance(value, list) and all(isinstance(item, str) for item in value)
     )
 
-    subparsers = parser.add_subparsers(dest="current_parser")
 
+def _is_int_list(value: Any) -> bool:
+    return value is None or (
+        isinstance(value, list)
+        and all(
+            isinstance(item, int) and not isinstance(item, bool) for item in value
+        )
+    )
+
+
+#: The accepted values of campaign operation keys, mapping the key to a tuple of
+#: ``(check, description)``. Values are checked before any operation is applied so
+#: that a malformed operation is never written to the campaign file.
+CAMPAIGN_OPERATION_VALUE_TYPES: Dict[str, Tuple[Callable[[Any], bool], str]] = {
+    "name": (_is_trace_name_or_id, "a trace name (string) or id (integer)"),
+    "stdin": (_is_str, "a string"),
+    "command": (_is_str, "a string"),
+    "source": (_is_str, "a string"),
+    "destination": (_is_optional_str, "a string"),
+    "permissions": (_is_permissions, "a string or boolean"),
+    "args": (_is_str_list, "a list of strings"),
+    "symbolic_indexes": (_is_int_list, "a list of integers"),
+}
+
+
+def _check_campaign_operations(operations: Any) -> None:
+    """
+    Verify that a list of campaign operations is well formed: each operation must be
+    an object with a recognized ``op``, all the keys that the operation requires, and
+    values of the expected types (see :data:`CAMPAIGN_OPERATION_VALUE_TYPES`).
+
+    :param operations: the operations to check
+    :raises ValueError: the operations are invalid, the message identifies the
+        offending operation by its index
+    """
+    if not isinstance(operations, list):
+        raise ValueError("campaign operations must be a list of objects")
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise ValueError(f"campaign operation {index}: expected an object")
+
+        op = operation.get("op")
+        if not isinstance(op, str) or op not in CAMPAIGN_OPERATION_REQUIRED_KEYS:
+            raise ValueError(
+                f"campaign operation {index}: unrecognized campaign operation: {op}"
+            )
+
+        missing = [
+            key for key in CAMPAIGN_OPERATION_REQUIRED_KEYS[op] if key not in operation
+        ]
+        if missing:
+            raise ValueError(
+                f"campaign operation {index} ({op}): missing required key(s): "
+                f"{', '.join(missing)}"
+            )
+
+        check: Callable[[Any], bool]
+        for key, value in operation.items():
+            if key == "name" and op == "add-trace":
+                # a new trace's name is optional and cannot be a trace id
+                check, description = _is_optional_str, "a string"
+            elif key in CAMPAIGN_OPERATION_VALUE_TYPES:
+                check, description = CAMPAIGN_OPERATION_VALUE_TYPES[key]
+            else:
+                continue
+
+            if not check(value):
+                raise ValueError(
+                    f"campaign operation {index} ({op}): {key} must be {description}"
+                )
+
+
+def _apply_campaign_operation(campaign: Campaign, operation: dict) -> None:
+    """
+    Apply a single operation to a loaded campaign, without saving the campaign. See
+    :func:`apply_campaign_operations` for the operation format.
+    """
+    project = campaign.project
+    op = operation.get("op")
+    if op == "add-trace":
+        add_campaign_trace(
+            project,
+            operation.get("args") or [],
+            operation.get("symbolic_indexes") or [],
+            operation.get("name"),
+            campaign=campaign,
+        )
+    elif op == "remove-trace":
+        remove_campaign_trace(project, operation["name"], campaign=campaign)
+    elif op == "set-trace-stdin":
+        set_trace_stdin(
+            project, operation["name"], operation["stdin"], campaign=campaign
+        )
+    elif op == "add-trace-input-file":
+        dest = operation.get("destination")
+        permissions = operation.get("permissions")
+        add_trace_input_file(
+            project,
+            operation["name"],
+            Path(operation["source"]),
+            Path(dest) if dest else None,
+            True if permissions is None else permissions,
+            campaign=campaign,
+        )
+    elif op == "remove-trace-input-file":
+        remove_trace_input_file(
+            project, operation["name"], Path(operation["source"]), campaign=campaign
+        )
+    elif op == "add-trace-setup":
+        add_trace_setup(
+            project, operation["name"], operation["command"], campaign=campaign
+        )
+    elif op == "add-trace-teardown":
+        add_trace_teardown(
+            project, operation["name"], operation["command"], campaign=campaign
+        )
+    else:
+        raise ValueError(f"unrecognized campaign operation: {op}")
+
+
+#: Help text shared by the subcommands that accept a trace name or id
+_ID_HELP = "force treating 'name' as the trace id"
+_NAME_HELP = "trace name (or trace id if --id is provided)"
+
+
+def _trace_name_arg(args: "argparse.Namespace") -> Union[str, int]:
+    """
+    :returns: the trace name or id specified on the command line
+    """
+    return int(args.name) if args.id else args.name
+
+
+def _add_new_parser(subparsers: "argparse._SubParsersAction") -> None:
     new_proj = subparsers.add_parser("new")
     new_proj.add_argument("project", help="Name of new analysis project")
     new_proj.add_argument("binary", type=Path, help="Path to binary used in analysis")
     new_proj.add_argument("template", default="", help="create campaign from template")
 
+
+def _cmd_new(parser: "argparse.ArgumentParser", args: "argparse.Namespace") -> None:
+    template = Path(args.template) if args.template else None
+    new_project(args.project, args.binary, template)
+
+
+def _add_list_projects_parser(subparsers: "argparse._SubParsersAction") -> None:
     subparsers.add_parser("list-projects")
 
+
+def _cmd_list_projects(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    _list()
+
+
+def _add_add_trace_parser(subparsers: "argparse._SubParsersAction") -> None:
     add_trace = subparsers.add_parser("add-trace")
     add_trace.add_argument("project", help="Project name")
     add_trace.add_argument("--name", action="store", help="trace name")
@@ -725,71 +1253,155 @@ def main() -> None:
     )
     add_trace.add_argument("args", nargs="*", help="command line arguments")
 
+
+def _cmd_add_trace(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    if args.symbolic_indexes:
+        symbolic_indexes = [int(i) for i in args.symbolic_indexes.split()]
+    else:
+        symbolic_indexes = []
+    add_campaign_trace(args.project, args.args, symbolic_indexes, args.name)
+
+
+def _add_remove_trace_parser(subparsers: "argparse._SubParsersAction") -> None:
     remove_trace = subparsers.add_parser("remove-trace")
     remove_trace.add_argument("project", help="Project name")
-    remove_trace.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
+    remove_trace.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
     remove_trace.add_argument("--all", action="store_true", help="remove all traces")
-    remove_trace.add_argument(
-        "name", nargs="?", help="trace name (or trace id if --id is provided)"
-    )
+    remove_trace.add_argument("name", nargs="?", help=_NAME_HELP)
+
+
+def _cmd_remove_trace(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    if args.name:
+        remove_campaign_trace(args.project, _trace_name_arg(args))
+    elif args.all:
+        remove_campaign_all_traces(args.project)
+    else:
+        parser.error("missing trace name or id")
 
+
+def _add_run_parser(subparsers: "argparse._SubParsersAction") -> None:
     run = subparsers.add_parser("run")
     run.add_argument("project", help="project name")
 
+
+def _cmd_run(parser: "argparse.ArgumentParser", args: "argparse.Namespace") -> None:
+    run_campaign(args.project)
+
+
+def _add_run_trace_parser(subparsers: "argparse._SubParsersAction") -> None:
     run_trace = subparsers.add_parser("run-trace")
-    run_trace.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
+    run_trace.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
     run_trace.add_argument(
         "--last", action="store_true", help="run the last registered trace"
     )
     run_trace.add_argument("project", help="Project name")
-    run_trace.add_argument(
-        "name", nargs="?", help="trace name (or trace id if --id is provided)"
-    )
+    run_trace.add_argument("name", nargs="?", help=_NAME_HELP)
+
 
+def _cmd_run_trace(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    name: Union[str, int]
+    if args.name:
+        name = _trace_name_arg(args)
+    elif args.last:
+        name = -1
+    else:
+        parser.error("missing trace name or id")
+
+    run_campaign_trace(args.project, name)
+
+
+def _add_validate_parser(subparsers: "argparse._SubParsersAction") -> None:
     validate = subparsers.add_parser("validate")
     validate.add_argument("project", help="Project name")
+    validate.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="maximum number of traces to validate concurrently",
+    )
+
+
+def _cmd_validate(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    validate_campaign(args.project, args.jobs)
 
+
+def _add_validate_args_parser(subparsers: "argparse._SubParsersAction") -> None:
     validate_args = subparsers.add_parser("validate-args")
     validate_args.add_argument("project", help="Project name")
     validate_args.add_argument(
         "args", nargs="*", help="command line arguments to validate against"
     )
 
+
+def _cmd_validate_args(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    validate_campaign_with_args(args.project, args.args)
+
+
+def _add_validate_trace_parser(subparsers: "argparse._SubParsersAction") -> None:
     validate_trace = subparsers.add_parser("validate-trace")
-    validate_trace.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
+    validate_trace.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
     validate_trace.add_argument("project", help="Project name")
-    validate_trace.add_argument(
-        "name", help="trace name (or trace id if --id is provided)"
-    )
+    validate_trace.add_argument("name", help=_NAME_HELP)
+
+
+def _cmd_validate_trace(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    validate_campaign_trace(args.project, _trace_name_arg(args))
 
+
+def _add_describe_parser(subparsers: "argparse._SubParsersAction") -> None:
     describe = subparsers.add_parser("describe")
     describe.add_argument("project", help="Project name")
 
+
+def _cmd_describe(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    describe_campaign(args.project)
+
+
+def _add_clear_trace_data_parser(subparsers: "argparse._SubParsersAction") -> None:
     clear_trace_data = subparsers.add_parser("clear-trace-data")
     clear_trace_data.add_argument("project", help="Project name")
 
+
+def _cmd_clear_trace_data(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    clear_project_trace_data(args.project)
+
+
+def _add_set_trace_stdin_parser(subparsers: "argparse._SubParsersAction") -> None:
     set_stdin = subparsers.add_parser("set-trace-stdin")
     set_stdin.add_argument("project", help="Project name")
-    set_stdin.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
-    set_stdin.add_argument("name", help="trace name (or trace id if --id is provided)")
+    set_stdin.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
+    set_stdin.add_argument("name", help=_NAME_HELP)
     set_stdin.add_argument("stdin", help="stdin content")
 
+
+def _cmd_set_trace_stdin(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    set_trace_stdin(args.project, _trace_name_arg(args), args.stdin)
+
+
+def _add_add_trace_input_file_parser(subparsers: "argparse._SubParsersAction") -> None:
     add_input_file = subparsers.add_parser("add-trace-input-file")
     add_input_file.add_argument("project", help="Project name")
-    add_input_file.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
-    add_input_file.add_argument(
-        "name", help="trace name (or trace id if --id is provided)"
-    )
+    add_input_file.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
+    add_input_file.add_argument("name", help=_NAME_HELP)
     add_input_file.add_argument("source", help="source filename", type=Path)
     add_input_file.add_argument("destination", help="destination file path", nargs="?")
     add_input_file.add_argument(
@@ -798,97 +1410,163 @@ def main() -> None:
         nargs="?",
     )
 
+
+def _cmd_add_trace_input_file(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    dest = Path(args.destination) if args.destination else None
+    permissions = args.permissions or True
+    add_trace_input_file(
+        args.project, _trace_name_arg(args), args.source, dest, permissions
+    )
+
+
+def _add_remove_trace_input_file_parser(
+    subparsers: "argparse._SubParsersAction",
+) -> None:
     remove_input_file = subparsers.add_parser("remove-trace-input-file")
     remove_input_file.add_argument("project", help="Project name")
-    remove_input_file.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
-    remove_input_file.add_argument(
-        "name", help="trace name (or trace id if --id is provided)"
-    )
+    remove_input_file.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
+    remove_input_file.add_argument("name", help=_NAME_HELP)
     remove_input_file.add_argument("source", help="source filename or path", type=Path)
 
+
+def _cmd_remove_trace_input_file(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    remove_trace_input_file(args.project, _trace_name_arg(args), args.source)
+
+
+def _add_add_trace_setup_parser(subparsers: "argparse._SubParsersAction") -> None:
     add_setup = subparsers.add_parser("add-trace-setup")
     add_setup.add_argument("project", help="Project name")
-    add_setup.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
-    )
-    add_setup.add_argument("name", help="trace name (or trace id if --id is provided)")
+    add_setup.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
+    add_setup.add_argument("name", help=_NAME_HELP)
     add_setup.add_argument("command", help="bash command to execute")
 
+
+def _cmd_add_trace_setup(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    add_trace_setup(args.project, _trace_name_arg(args), args.command)
+
+
+def _add_add_trace_teardown_parser(subparsers: "argparse._SubParsersAction") -> None:
     add_teardown = subparsers.add_parser("add-trace-teardown")
     add_teardown.add_argument("project", help="Project name")
-    add_teardown.add_argument(
-        "-i", "--id", action="store_true", help="force treating 'name' as the trace id"
+    add_teardown.add_argument("-i", "--id", action="store_true", help=_ID_HELP)
+    add_teardown.add_argument("name", help=_NAME_HELP)
+    add_teardown.add_argument("command", help="bash command to execute")
+
+
+def _cmd_add_trace_teardown(
+    parser: "argparse.ArgumentParser", args: "argparse.Namespace"
+) -> None:
+    add_trace_teardown(args.project, _trace_name_arg(args), args.command)
+
+
+def _add_apply_parser(subparsers: "argparse._SubParsersAction") -> None:
+    apply_ops = subparsers.add_parser("apply")
+    apply_ops.add_argument("project", help="Project name")
+    apply_ops.add_argument(
+        "--ops-file",
+        type=Path,
+        help="JSON file containing the list of operations to apply (default: stdin)",
     )
-    add_teardown.add_argument(
-        "name", help="trace name (or trace id if --id is provided)"
+
+
+def _cmd_apply(parser: "argparse.ArgumentParser", args: "argparse.Namespace") -> None:
+    content = args.ops_file.read_bytes() if args.ops_file else sys.stdin.buffer.read()
+    try:
+        # JSON decoding errors are a subclass of ValueError
+        operations = _json.loads(content)
+        _check_campaign_operations(operations)
+    except ValueError as err:
+        parser.error(f"invalid campaign operations: {err}")
+
+    apply_campaign_operations(args.project, operations)
+
+
+#: Command line subcommands, mapping the subcommand name to a tuple of
+#: ``(add_parser, handler)``. ``add_parser`` registers the subcommand's parser and
+#: ``handler`` executes the subcommand with the parsed arguments.
+CLI_COMMANDS: Dict[
+    str,
+    Tuple[
+        Callable[["argparse._SubParsersAction"], None],
+        Callable[["argparse.ArgumentParser", "argparse.Namespace"], None],
+    ],
+] = {
+    "new": (_add_new_parser, _cmd_new),
+    "list-projects": (_add_list_projects_parser, _cmd_list_projects),
+    "add-trace": (_add_add_trace_parser, _cmd_add_trace),
+    "remove-trace": (_add_remove_trace_parser, _cmd_remove_trace),
+    "run": (_add_run_parser, _cmd_run),
+    "run-trace": (_add_run_trace_parser, _cmd_run_trace),
+    "validate": (_add_validate_parser, _cmd_validate),
+    "validate-args": (_add_validate_args_parser, _cmd_validate_args),
+    "validate-trace": (_add_validate_trace_parser, _cmd_validate_trace),
+    "describe": (_add_describe_parser, _cmd_describe),
+    "clear-trace-data": (_add_clear_trace_data_parser, _cmd_clear_trace_data),
+    "set-trace-stdin": (_add_set_trace_stdin_parser, _cmd_set_trace_stdin),
+    "add-trace-input-file": (
+        _add_add_trace_input_file_parser,
+        _cmd_add_trace_input_file,
+    ),
+    "remove-trace-input-file": (
+        _add_remove_trace_input_file_parser,
+        _cmd_remove_trace_input_file,
+    ),
+    "add-trace-setup": (_add_add_trace_setup_parser, _cmd_add_trace_setup),
+    "add-trace-teardown": (_add_add_trace_teardown_parser, _cmd_add_trace_teardown),
+    "apply": (_add_apply_parser, _cmd_apply),
+}
+
+
+def _build_parser(argv: List[str]) -> "argparse.ArgumentParser":
+    """
+    Build the command line parser. When ``argv`` names a known subcommand, only that
+    subcommand's parser is registered, so the remaining subcommands' arguments are
+    never built. Otherwise (no subcommand, ``--help``, or an unknown subcommand), all
+    subcommands are registered so that usage and error messages are complete.
+
+    :param argv: the command line arguments, excluding the program name
+    :returns: the command line parser
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-v", "--verbose", action="count", help="enable verbose logging"
     )
-    add_teardown.add_argument("command", help="bash command to execute")
 
+    subparsers = parser.add_subparsers(dest="current_parser")
+
+    # the only top-level option is the -v flag, so the first argument that is not an
+    # option is the subcommand
+    command = next((arg for arg in argv if not arg.startswith("-")), None)
+    if command in CLI_COMMANDS:
+        CLI_COMMANDS[command][0](subparsers)
+    else:
+        for add_parser, _ in CLI_COMMANDS.values():
+            add_parser(subparsers)
+
+    return parser
+
+
+def main() -> None:
+    from .core import enable_binrec_debug_mode, init_binrec
+
+    init_binrec()
+
+    parser = _build_parser(sys.argv[1:])
     args = parser.parse_args()
 
     if args.verbose:
         enable_binrec_debug_mode()
 
-    if args.current_parser == "new":
-        template = Path(args.template) if args.template else None
-        new_project(args.project, args.binary, template)
-    elif args.current_parser == "list-projects":
-        _list()
-    elif args.current_parser == "add-trace":
-        if args.symbolic_indexes:
-            symbolic_indexes = [int(i) for i in args.symbolic_indexes.split()]
-        else:
-            symbolic_indexes = []
-        add_campaign_trace(args.project, args.args, symbolic_indexes, args.name)
-    elif args.current_parser == "remove-trace":
-        if args.name:
-            name = int(args.name) if args.id else args.name
-            remove_campaign_trace(args.project, name)
-        elif args.all:
-            remove_campaign_all_traces(args.project)
-        else:
-            parser.error("missing trace name or id")
-    elif args.current_parser == "describe":
-        describe_campaign(args.project)
-    elif args.current_parser == "run":
-        run_campaign(args.project)
-    elif args.current_parser == "run-trace":
-        if args.name:
-            name = int(args.name) if args.id else args.name
-        elif args.last:
-            name = -1
-        else:
-            parser.error("missing trace name or id")
-
-        run_campaign_trace(args.project, name)
-    elif args.current_parser == "validate":
-        validate_campaign(args.project)
-    elif args.current_parser == "validate-trace":
-        name = int(args.name) if args.id else args.name
-        validate_campaign_trace(args.project, name)
-    elif args.current_parser == "validate-args":
-        validate_campaign_with_args(args.project, args.args)
-    elif args.current_parser == "clear-trace-data":
-        clear_project_trace_data(args.project)
-    elif args.current_parser == "set-trace-stdin":
-        name = int(args.name) if args.id else args.name
-        set_trace_stdin(args.project, name, args.stdin)
-    elif args.current_parser == "add-trace-input-file":
-        name = int(args.name) if args.id else args.name
-        dest = Path(args.destination) if args.destination else None
-        permissions = args.permissions or True
-        add_trace_input_file(args.project, name, args.source, dest, permissions)
-    elif args.current_parser == "remove-trace-input-file":
-        name = int(args.name) if args.id else args.name
-        remove_trace_input_file(args.project, name, args.source)
-    elif args.current_parser == "add-trace-setup":
-        name = int(args.name) if args.id else args.name
-        add_trace_setup(args.project, name, args.command)
-    elif args.current_parser == "add-trace-teardown":
-        name = int(args.name) if args.id else args.name
-        add_trace_teardown(args.project, name, args.command)
+    if args.current_parser in CLI_COMMANDS:
+        CLI_COMMANDS[args.current_parser][1](parser, args)
     else:
         parser.print_help()
 
@@ -1,5 +1,8 @@
 import json
 import logging
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import patch, mock_open, call, MagicMock
 
@@ -247,6 +250,13 @@ class TestTraceParams:
         symlink.unlink.assert_not_called()
         not_symlink.unlink.assert_not_called()
 
+    def test_check_input_files(self):
+        input_files = [MagicMock(), MagicMock()]
+        params = campaign.TraceParams(input_files=input_files)
+        params.check_input_files(Path("/root"))
+        for input_file in input_files:
+            input_file.check_source.assert_called_once_with(Path("/root"))
+
     def test_create_trace_args(self):
         assert campaign.TraceParams.create_trace_args(["first", "second"], [2]) == [
             campaign.TraceArg(campaign.TraceArgType.concrete, "first"),
@@ -285,7 +295,7 @@ class TestCampaign:
             ],
             project=project_name
         )
-        mock_file.assert_called_once_with(filename, "r")
+        mock_file.assert_called_once_with(filename, "r", encoding="utf-8")
         mock_file().read.assert_called_once_with()
         mock_validate.assert_called_once_with(JSON_BATCH)
 
@@ -302,7 +312,7 @@ class TestCampaign:
             ],
             project=project_name
         )
-        mock_file.assert_called_once_with(filename, "r")
+        mock_file.assert_called_once_with(filename, "r", encoding="utf-8")
         mock_file().read.assert_called_once_with()
         mock_input_file_cls.return_value.check_source.assert_called_once_with(filename.parent)
 
@@ -337,30 +347,30 @@ class TestPatchProject:
         with pytest.raises(ValueError):
             campaign.patch_s2e_project("asdf")
 
-    @patch.object(campaign, "open", new_callable=mock_open)
-    def test_save_str(self, mock_file):
+    def test_save_str(self, tmp_path):
         binary = Path("/eq")
         c = campaign.Campaign(binary=binary)
-        c.save("./camp.j")
-        mock_file.assert_called_once_with("./camp.j", "w")
-        mock_file().write.assert_called_once_with(json.dumps({
+        dest = tmp_path / "camp.j"
+        c.save(str(dest))
+        assert json.loads(dest.read_text()) == {
             "traces": [],
             "setup": [],
             "teardown": []
-        }, indent=2))
+        }
+        assert list(tmp_path.iterdir()) == [dest]
 
-    @patch.object(campaign, "open", new_callable=mock_open)
-    def test_save_path(self, mock_file):
+    def test_save_path(self, tmp_path):
         binary = Path("/eq")
         c = campaign.Campaign(binary=binary)
-        dest = Path("/camp.j")
+        dest = tmp_path / "camp.j"
+        dest.write_text("previous content")
         c.save(dest)
-        mock_file.assert_called_once_with(dest, "w")
-        mock_file().write.assert_called_once_with(json.dumps({
+        assert json.loads(dest.read_text()) == {
             "traces": [],
             "setup": [],
             "teardown": []
-        }, indent=2))
+        }
+        assert list(tmp_path.iterdir()) == [dest]
 
     def test_save_file(self):
         binary = Path("/eq")
@@ -373,20 +383,85 @@ class TestPatchProject:
             "teardown": []
         }, indent=2))
 
-    @patch.object(campaign, "open", new_callable=mock_open)
     @patch.object(campaign, "campaign_filename")
-    def test_save_default(self, mock_filename, mock_file):
+    def test_save_default(self, mock_filename, tmp_path):
         binary = Path("/eq")
-        mock_filename.return_value = "/campaign.json"
+        mock_filename.return_value = tmp_path / "campaign.json"
         c = campaign.Campaign(binary=binary, project="asdf")
         c.save()
         mock_filename.assert_called_once_with("asdf")
-        mock_file.assert_called_once_with(mock_filename.return_value, "w")
-        mock_file().write.assert_called_once_with(json.dumps({
+        assert json.loads(mock_filename.return_value.read_text()) == {
             "traces": [],
             "setup": [],
             "teardown": []
-        }, indent=2))
+        }
+
+    @patch.object(campaign.os, "replace")
+    def test_save_error_cleanup(self, mock_replace, tmp_path):
+        mock_replace.side_effect = OSError("asdf")
+        c = campaign.Campaign(binary=Path("/eq"))
+        with pytest.raises(OSError):
+            c.save(tmp_path / "camp.j")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_save_concurrent(self, tmp_path):
+        dest = tmp_path / "camp.j"
+        campaigns = [
+            campaign.Campaign(Path("/eq"), traces=[campaign.TraceParams(name=str(i))])
+            for i in range(8)
+        ]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in pool.map(lambda c: [c.save(dest) for _ in range(20)], campaigns):
+                pass
+
+        assert len(json.loads(dest.read_text())["traces"]) == 1
+        assert list(tmp_path.iterdir()) == [dest]
+
+    def test_save_preserves_mode_and_symlink(self, tmp_path):
+        target = tmp_path / "real.json"
+        target.write_text("{}")
+        target.chmod(0o640)
+        link = tmp_path / "campaign.json"
+        link.symlink_to(target)
+
+        campaign.Campaign(Path("/eq"), setup=["ünïcode"]).save(link)
+
+        assert link.is_symlink()
+        assert stat.S_IMODE(target.stat().st_mode) == 0o640
+        assert json.loads(target.read_text(encoding="utf-8"))["setup"] == ["ünïcode"]
+        assert sorted(tmp_path.iterdir()) == [link, target]
+
+    def test_save_new_file_mode(self, tmp_path):
+        dest = tmp_path / "camp.j"
+        umask = os.umask(0o027)
+        try:
+            campaign.Campaign(Path("/eq")).save(dest)
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(dest.stat().st_mode) == 0o640
+
+    def test_load_json_utf8(self, tmp_path):
+        filename = tmp_path / "campaign.json"
+        campaign.Campaign(Path("/eq"), setup=["ünïcode"]).save(filename)
+        loaded = campaign.Campaign.load_json(Path("/eq"), filename, "asdf")
+        assert loaded.setup == ["ünïcode"]
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_fast_dumps(self, use_orjson):
+        body = {
+            "args": [{"arg_type": campaign.TraceArgType.symbolic, "value": "x"}],
+            "source": Path("/input.txt"),
+        }
+        expected = {
+            "args": [{"arg_type": "symbolic", "value": "x"}],
+            "source": "/input.txt",
+        }
+        orjson = campaign.orjson if use_orjson else None
+        if use_orjson and orjson is None:
+            pytest.skip("orjson is not installed")
+
+        with patch.object(campaign, "orjson", orjson):
+            assert json.loads(campaign._fast_dumps(body)) == expected
 
     def test_remove_trace_str(self):
         c = campaign.Campaign(MagicMock(), traces=[
@@ -460,6 +535,55 @@ class TestPatchProject:
         with pytest.raises(IndexError):
             c.get_trace(1)
 
+    def test_find_trace_index(self):
+        c = campaign.Campaign(MagicMock(), traces=[
+            campaign.TraceParams(),
+            campaign.TraceParams(name="asdf"),
+            campaign.TraceParams(name="qwer"),
+            campaign.TraceParams(name="asdf"),
+        ])
+
+        assert c.find_trace_index("asdf") == 1
+        assert c.find_trace_index("qwer") == 2
+        assert c.find_trace_index("zxcv") is None
+
+    def test_find_trace_index_modified(self):
+        c = campaign.Campaign(MagicMock(), traces=[
+            campaign.TraceParams(name="asdf"),
+            campaign.TraceParams(name="qwer"),
+        ])
+        assert c.find_trace_index("qwer") == 1
+
+        c.traces.pop(0)
+        assert c.find_trace_index("qwer") == 0
+
+        c.traces.append(campaign.TraceParams(name="zxcv"))
+        assert c.find_trace_index("zxcv") == 1
+
+        c.traces[0].name = "renamed"
+        assert c.find_trace_index("qwer") is None
+        assert c.find_trace_index("renamed") == 0
+
+        c.traces = [campaign.TraceParams(name="new")]
+        assert c.find_trace_index("new") == 0
+        assert c.find_trace_index("zxcv") is None
+
+    def test_find_trace_index_renamed_to_duplicate(self):
+        first, second = campaign.TraceParams(name="a"), campaign.TraceParams(name="b")
+        c = campaign.Campaign(MagicMock(), traces=[first, second])
+        assert c.find_trace_index("b") == 1
+
+        c.traces[0].name = "b"
+        assert c.find_trace_index("b") == 0
+        assert c.find_trace_index("a") is None
+
+        c.remove_trace("b")
+        assert len(c.traces) == 1 and c.traces[0] is second
+
+        c.traces[0] = campaign.TraceParams(name="c")
+        assert c.find_trace_index("b") is None
+        assert c.find_trace_index("c") == 0
+
     @patch.object(campaign.Campaign, "load_json")
     @patch.object(campaign, "project_binary_filename")
     @patch.object(campaign, "campaign_filename")
@@ -1,10 +1,13 @@
 from pathlib import Path
+import json
+import os
 import subprocess
-from unittest.mock import patch, mock_open, call, MagicMock
+import sys
+from unittest.mock import patch, mock_open, call, MagicMock, ANY
 
 import pytest
 
-from binrec import project
+from binrec import campaign, project
 from binrec.env import BINREC_PROJECTS
 from binrec.errors import BinRecError
 from helpers.mock_path import MockPath
@@ -72,11 +75,229 @@ class TestProject:
         calls = [call(c, 1), call(c, 2), call(c, 3)]
         mock_validate_lift_result.assert_has_calls(calls, any_order=False)
 
-    @patch.object(project, "subprocess")
-    def test_run_trace_setup(self, mock_subproc):
+    def test_resolve_trace_name_or_id(self):
+        traces = [project.TraceParams(name="asdf"), project.TraceParams(name="5")]
+        c = project.Campaign(Path("/binary"), traces=traces)
+        assert project._resolve_trace_name_or_id(c, "asdf") == (0, traces[0])
+        assert project._resolve_trace_name_or_id(c, 1) == (1, traces[1])
+        assert project._resolve_trace_name_or_id(c, "-1") == (1, traces[1])
+        assert project._resolve_trace_name_or_id(c, "5") == (1, traces[1])
+
+        with pytest.raises(KeyError):
+            project._resolve_trace_name_or_id(c, "qwer")
+
+        with pytest.raises(KeyError):
+            project._resolve_trace_name_or_id(c, 2)
+
+    def test_resolve_trace_name_or_id_numeric_names(self):
+        traces = [project.TraceParams(name="-x"), project.TraceParams(name="10")]
+        c = project.Campaign(Path("/binary"), traces=traces)
+        assert project._resolve_trace_name_or_id(c, "-x") == (0, traces[0])
+        assert project._resolve_trace_name_or_id(c, "10") == (1, traces[1])
+        assert project._resolve_trace_name_or_id(c, "-2") == (0, traces[0])
+
+        with pytest.raises(KeyError):
+            project._resolve_trace_name_or_id(c, "-")
+
+        with pytest.raises(KeyError):
+            project._resolve_trace_name_or_id(c, -3)
+
+    def test_s2e_config_template(self):
+        config = project.S2E_CONFIG_TEMPLATE.substitute(
+            project_path=Path("/projects/x"), input_files=Path("/projects/x/input")
+        )
+        assert '        "/projects/x"\n' in config
+        assert 'baseDirs, "/projects/x/input")\n' in config
+        assert "$" not in config
+
+    def test_add_trace_input_file(self, tmp_path):
+        source = tmp_path / "input.txt"
+        source.write_text("hello")
+        c = project.Campaign(Path("/binary"), traces=[project.TraceParams(name="t")])
+        project.add_trace_input_file("proj", "t", source, campaign=c)
+        assert c.traces[0].input_files == [
+            project.TraceInputFile(source.absolute(), None, True)
+        ]
+
+    @patch.object(project.os, "access")
+    def test_add_trace_input_file_errors(self, mock_access, tmp_path):
+        c = project.Campaign(Path("/binary"), traces=[project.TraceParams(name="t")])
+        with pytest.raises(FileNotFoundError):
+            project.add_trace_input_file("proj", "t", tmp_path / "x", campaign=c)
+
+        with pytest.raises(IsADirectoryError):
+            project.add_trace_input_file("proj", "t", tmp_path, campaign=c)
+
+        source = tmp_path / "input.txt"
+        source.write_text("hello")
+        mock_access.return_value = False
+        with pytest.raises(PermissionError):
+            project.add_trace_input_file("proj", "t", source, campaign=c)
+
+        mock_access.assert_called_once_with(source, os.R_OK)
+        assert c.traces[0].input_files == []
+
+    def test_build_parser_single_command(self):
+        parser = project._build_parser(["-v", "describe", "proj"])
+        subparsers = parser._subparsers._group_actions[0]
+        assert list(subparsers.choices) == ["describe"]
+        args = parser.parse_args(["-v", "describe", "proj"])
+        assert args.current_parser == "describe"
+        assert args.project == "proj"
+
+    def test_build_parser_all_commands(self):
+        for argv in ([], ["--help"], ["unknown"]):
+            parser = project._build_parser(argv)
+            subparsers = parser._subparsers._group_actions[0]
+            assert list(subparsers.choices) == list(project.CLI_COMMANDS)
+
+    def test_import_does_not_load_argparse(self):
+        output = subprocess.check_output([
+            sys.executable,
+            "-c",
+            "import sys, binrec.project; print('argparse' in sys.modules)",
+        ])
+        assert output.strip() == b"False"
+
+    @patch.object(project, "remove_campaign_trace")
+    @patch("binrec.core.init_binrec")
+    def test_main_dispatch(self, mock_init, mock_remove):
+        with patch.object(project.sys, "argv", ["prog", "remove-trace", "-i", "p", "1"]):
+            project.main()
+        mock_remove.assert_called_once_with("p", 1)
+
+    @patch.object(project.subprocess, "check_output")
+    def test_listing(self, mock_check_output):
+        mock_check_output.return_value = b'{"projects": {"asdf": {}, "qwer": {}}}'
+        assert list(project.listing()) == ["asdf", "qwer"]
+        mock_check_output.assert_called_once_with(["s2e", "info"])
+
+    @patch.object(project.subprocess, "check_output")
+    def test_listing_error(self, mock_check_output):
+        mock_check_output.side_effect = subprocess.CalledProcessError(1, "s2e")
+        with pytest.raises(BinRecError):
+            project.listing()
+
+    @patch.object(project, "_link_lifted_input_files")
+    @patch.object(project.TraceParams, "setup_input_file_directory")
+    @patch.object(project, "_validate_campaign_trace")
+    def test_validate_campaign_concurrent(self, mock_validate, mock_setup_dir, mock_link):
+        traces = [project.TraceParams(name=str(i)) for i in range(3)]
+        c = project.Campaign(Path("/binary"), traces=traces, project="asdf")
+
+        project.validate_campaign(c, jobs=2)
+
+        mock_setup_dir.assert_called_once_with("asdf")
+        mock_link.assert_called_once_with("asdf")
+        calls = [
+            call(c, trace, prepare_input_files=False) for trace in traces
+        ]
+        mock_validate.assert_has_calls(calls, any_order=True)
+        assert mock_validate.call_count == 3
+
+    @patch.object(project, "_validate_campaign_trace")
+    def test_validate_campaign_concurrent_error(self, mock_validate):
+        traces = [project.TraceParams(name=str(i)) for i in range(3)]
+        c = project.Campaign(Path("/binary"), traces=traces, project="asdf")
+        mock_validate.side_effect = [None, AssertionError("mismatch"), None]
+
+        with patch.object(project, "_link_lifted_input_files"), patch.object(
+            project.TraceParams, "setup_input_file_directory"
+        ):
+            with pytest.raises(AssertionError):
+                project.validate_campaign(c, jobs=3)
+
+    @patch.object(project, "_validate_campaign_trace")
+    def test_validate_campaign_concurrent_shared_state(self, mock_validate):
+        traces = [project.TraceParams(name="1"), project.TraceParams(name="2", setup=["x"])]
+        c = project.Campaign(Path("/binary"), traces=traces, project="asdf")
+
+        project.validate_campaign(c, jobs=2)
+
+        mock_validate.assert_has_calls([call(c, traces[0]), call(c, traces[1])])
+
+    @patch.object(project, "_link_lifted_input_files")
+    @patch.object(project.TraceParams, "setup_input_file_directory")
+    @patch.object(project, "merged_trace_dir")
+    def test_validate_campaign_trace_large_output(self, mock_merged_dir, mock_setup_dir, mock_link, tmp_path):
+        # write more than the pipe buffer size to both stdout and stderr
+        script = "#!/bin/sh\nhead -c 200000 /dev/zero\nhead -c 200000 /dev/zero >&2\ncat\n"
+        for name in ("binary", "recovered"):
+            (tmp_path / name).write_text(script)
+            (tmp_path / name).chmod(0o755)
+
+        mock_merged_dir.return_value = tmp_path
+        c = project.Campaign(Path("/binary"), project="asdf")
+        trace = project.TraceParams(stdin="hello")
+
+        project._validate_campaign_trace(c, trace)
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["binary", "recovered"]
+
+    @patch.object(project, "_link_lifted_input_files")
+    @patch.object(project.TraceParams, "setup_input_file_directory")
+    @patch.object(project, "merged_trace_dir")
+    def test_validate_campaign_trace_mismatch(self, mock_merged_dir, mock_setup_dir, mock_link, tmp_path):
+        (tmp_path / "binary").write_text("#!/bin/sh\necho original\n")
+        (tmp_path / "recovered").write_text("#!/bin/sh\necho lifted\n")
+        for name in ("binary", "recovered"):
+            (tmp_path / name).chmod(0o755)
+
+        mock_merged_dir.return_value = tmp_path
+        c = project.Campaign(Path("/binary"), project="asdf")
+
+        with pytest.raises(AssertionError):
+            project._validate_campaign_trace(c, project.TraceParams())
+
+        project._validate_campaign_trace(c, project.TraceParams(match_stdout="^lifted$"))
+
+    @patch.object(project, "_link_lifted_input_files")
+    @patch.object(project.TraceParams, "setup_input_file_directory")
+    @patch.object(project, "merged_trace_dir")
+    @patch.object(project.subprocess, "Popen")
+    def test_validate_campaign_trace_argv0(self, mock_popen, mock_merged_dir, mock_setup_dir, mock_link):
+        mock_merged_dir.return_value = Path("/merged")
+        proc = mock_popen.return_value
+        proc.communicate.return_value = (b"out", b"err")
+        proc.returncode = 0
+        c = project.Campaign(Path("/binary"), project="asdf")
+
+        project._validate_campaign_trace(c, project.TraceParams(args=[project.TraceArg(value="x")]))
+
+        kwargs = dict(
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            cwd="/merged",
+        )
+        assert mock_popen.call_args_list == [
+            call(["/merged/test-target", "x"], executable="/merged/binary", **kwargs),
+            call(["/merged/test-target", "x"], executable="/merged/recovered", **kwargs),
+        ]
+
+    @patch.object(project, "_run_bash_script")
+    def test_run_trace_setup(self, mock_run_script):
         trace = MagicMock(setup=['asdf', 'qwer'])
         project._run_trace_setup(MagicMock(), trace, Path("path"))
-        mock_subproc.run.assert_called_once_with(["/bin/bash", "--noprofile"], input=b"asdf\nqwer", cwd="path")
+        mock_run_script.assert_called_once_with(['asdf', 'qwer'], Path("path"))
+
+    @patch.object(project, "_run_bash_script")
+    def test_run_trace_setup_inherit(self, mock_run_script):
+        trace = MagicMock(setup=[])
+        project._run_trace_setup(MagicMock(setup=['zxcv']), trace, Path("path"))
+        mock_run_script.assert_called_once_with(['zxcv'], Path("path"))
+
+    @patch.object(project.subprocess, "run")
+    def test_run_bash_script(self, mock_run):
+        scripts = []
+        mock_run.side_effect = lambda args, stdin, cwd: scripts.append(stdin.read())
+        project._run_bash_script(['asdf', 'qwer'], Path("path"))
+        mock_run.assert_called_once_with(["/bin/bash", "--noprofile"], stdin=ANY, cwd="path")
+        assert scripts == [b"asdf\nqwer\n"]
+
+    def test_run_bash_script_exec(self, tmp_path):
+        project._run_bash_script(['echo hello > out.txt', 'echo world >> out.txt'], tmp_path)
+        assert (tmp_path / "out.txt").read_text() == "hello\nworld\n"
 
     @patch.object(project, "subprocess")
     def test_run_trace_setup_empty(self, mock_subproc):
@@ -84,11 +305,11 @@ class TestProject:
         project._run_trace_setup(MagicMock(setup=[]), trace, Path("path"))
         mock_subproc.run.assert_not_called()
 
-    @patch.object(project, "subprocess")
-    def test_run_trace_teardown(self, mock_subproc):
+    @patch.object(project, "_run_bash_script")
+    def test_run_trace_teardown(self, mock_run_script):
         trace = MagicMock(teardown=['asdf', 'qwer'])
         project._run_trace_teardown(MagicMock(), trace, Path("path"))
-        mock_subproc.run.assert_called_once_with(["/bin/bash", "--noprofile"], input=b"asdf\nqwer", cwd="path")
+        mock_run_script.assert_called_once_with(['asdf', 'qwer'], Path("path"))
 
     @patch.object(project, "subprocess")
     def test_run_trace_teardown_empty(self, mock_subproc):
@@ -96,22 +317,62 @@ class TestProject:
         project._run_trace_teardown(MagicMock(teardown=[]), trace, Path("path"))
         mock_subproc.run.assert_not_called()
 
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "_run_campaign_trace")
+    @patch.object(project, "Campaign")
+    def test_run_campaign_trace_resolve(self, mock_campaign_cls, mock_run, mock_filename):
+        traces = [MagicMock(), MagicMock()]
+        traces[0].name = "tr1"
+        traces[1].name = "tr2"
+        c = mock_campaign_cls.load_project.return_value = campaign.Campaign(
+            Path("/binary"), traces=traces
+        )
+        mock_filename.return_value = Path("/project/campaign.json")
+
+        project.run_campaign_trace("asdf", "tr2")
+
+        mock_campaign_cls.load_project.assert_called_once_with("asdf", resolve_input_files=False)
+        traces[0].check_input_files.assert_not_called()
+        traces[1].check_input_files.assert_called_once_with(Path("/project"))
+        mock_run.assert_called_once_with(c, traces[1])
+
+    @patch.object(project.os, "close")
+    @patch.object(project.os, "open")
     @patch.object(project.subprocess, "check_call")
     @patch.object(project, "_get_next_trace_log_filename")
-    def test_run_campaign_trace(self, mock_log_filename, mock_check_call):
+    def test_run_campaign_trace(
+        self, mock_log_filename, mock_check_call, mock_open_fd, mock_close
+    ):
         c = MagicMock()
         trace = MagicMock()
         logfile = mock_log_filename.return_value = MockPath("s2e-out-0.log")
         project._run_campaign_trace(c, trace)
         trace.setup_input_file_directory.assert_called_once_with(c.project)
         trace.write_config_script.assert_called_once_with(c.project)
+        mock_open_fd.assert_called_once_with(
+            logfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+        )
         mock_check_call.assert_called_once_with(
             ["s2e", "run", "--no-tui", c.project],
-            stdout=logfile.open.return_value,
+            stdout=mock_open_fd.return_value,
             stderr=subprocess.STDOUT
         )
+        mock_close.assert_called_once_with(mock_open_fd.return_value)
         mock_log_filename.assert_called_once_with(c.project)
 
+    @patch.object(project.subprocess, "check_call")
+    @patch.object(project, "_get_next_trace_log_filename")
+    def test_run_campaign_trace_error(self, mock_log_filename, mock_check_call, tmp_path):
+        logfile = mock_log_filename.return_value = tmp_path / "s2e-out-0.log"
+        mock_check_call.side_effect = subprocess.CalledProcessError(1, "s2e")
+        fd_count = len(os.listdir("/proc/self/fd"))
+
+        with pytest.raises(BinRecError):
+            project._run_campaign_trace(MagicMock(), MagicMock())
+
+        assert logfile.is_file()
+        assert len(os.listdir("/proc/self/fd")) == fd_count
+
     @patch.object(project, "project_dir")
     @patch.object(project.subprocess, "check_call")
     def test_new_project_error(self, mock_check_call, mock_project_dir):
@@ -125,3 +386,430 @@ class TestProject:
         mock_project_dir.return_value = MockPath("/asdf", is_dir=True)
         with pytest.raises(FileExistsError):
             project.new_project("asdf", "/binary")
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "Campaign")
+    def test_load_project_cached(self, mock_campaign_cls, mock_filename, tmp_path):
+        filename = mock_filename.return_value = tmp_path / "campaign.json"
+        filename.write_text("{}")
+        project._campaign_cache.clear()
+
+        mock_campaign_cls.load_project.return_value = campaign.Campaign(
+            Path("/binary"), traces=[campaign.TraceParams(name="tr1")]
+        )
+        first = project._load_project_cached("asdf", resolve_input_files=False)
+        first.traces[0].setup.append("modified")
+        second = project._load_project_cached("asdf", resolve_input_files=False)
+
+        assert first is not second
+        assert second.traces[0].setup == []
+        mock_campaign_cls.load_project.assert_called_once_with(
+            "asdf", resolve_input_files=False
+        )
+        project._campaign_cache.clear()
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "Campaign")
+    def test_load_project_cached_modified(self, mock_campaign_cls, mock_filename, tmp_path):
+        filename = mock_filename.return_value = tmp_path / "campaign.json"
+        filename.write_text("{}")
+        project._campaign_cache.clear()
+
+        project._load_project_cached("asdf")
+        mtime = filename.stat().st_mtime_ns
+        os.utime(filename, ns=(mtime + 1000, mtime + 1000))
+        project._load_project_cached("asdf")
+
+        assert mock_campaign_cls.load_project.call_count == 2
+        project._campaign_cache.clear()
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "Campaign")
+    def test_load_project_cached_invalidate(self, mock_campaign_cls, mock_filename, tmp_path):
+        filename = mock_filename.return_value = tmp_path / "campaign.json"
+        filename.write_text("{}")
+        project._campaign_cache.clear()
+
+        project._load_project_cached("asdf", resolve_input_files=False)
+        project._load_project_cached("asdf", resolve_input_files=True)
+        project._invalidate("asdf")
+
+        assert project._campaign_cache == {}
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "Campaign")
+    def test_load_project_cached_missing(self, mock_campaign_cls, mock_filename, tmp_path):
+        mock_filename.return_value = tmp_path / "campaign.json"
+        project._campaign_cache.clear()
+
+        project._load_project_cached("asdf")
+        project._load_project_cached("asdf")
+
+        assert mock_campaign_cls.load_project.call_count == 2
+        assert project._campaign_cache == {}
+
+    @patch.object(project, "campaign_transaction")
+    def test_remove_campaign_all_traces(self, mock_transaction):
+        c = mock_transaction.return_value.__enter__.return_value = project.Campaign(
+            Path("/binary"), traces=[project.TraceParams(name="tr1")], setup=["a"]
+        )
+        project.remove_campaign_all_traces("asdf")
+        mock_transaction.assert_called_once_with("asdf")
+        assert c.traces == []
+        assert c.setup == ["a"]
+
+    @patch.object(project, "_load_project_cached")
+    def test_apply_campaign_operations(self, mock_load, tmp_path):
+        input_file = tmp_path / "input.txt"
+        input_file.write_text("hello")
+        c = mock_load.return_value = project.Campaign(Path("/binary"), project="asdf")
+        c.save = MagicMock()
+        project.apply_campaign_operations("asdf", [
+            {"op": "add-trace", "name": "tr1", "args": ["a", "b"], "symbolic_indexes": [2]},
+            {"op": "add-trace", "name": "tr2", "args": ["c"]},
+            {"op": "set-trace-stdin", "name": "tr1", "stdin": "input"},
+            {"op": "add-trace-input-file", "name": "tr1", "source": str(input_file)},
+            {"op": "add-trace-setup", "name": "tr1", "command": "touch x"},
+            {"op": "add-trace-teardown", "name": 0, "command": "rm x"},
+            {"op": "remove-trace", "name": "tr2"},
+        ])
+
+        mock_load.assert_called_once_with("asdf", resolve_input_files=False)
+        assert [trace.name for trace in c.traces] == ["tr1"]
+        trace = c.traces[0]
+        assert trace.command_line_args == ["a", "b"]
+        assert trace.symbolic_indexes == [2]
+        assert trace.stdin == "input"
+        assert [f.source for f in trace.input_files] == [input_file]
+        assert trace.setup == ["touch x"]
+        assert trace.teardown == ["rm x"]
+        c.save.assert_called_once_with()
+
+    @patch.object(project, "_load_project_cached")
+    def test_apply_campaign_operations_invalid(self, mock_load):
+        c = mock_load.return_value = MagicMock()
+        with pytest.raises(ValueError):
+            project.apply_campaign_operations("asdf", [{"op": "asdf"}])
+        c.save.assert_not_called()
+
+    @pytest.mark.parametrize("operations,message", [
+        ({"op": "add-trace"}, "must be a list"),
+        (["add-trace"], "operation 0: expected an object"),
+        ([{"op": "add-trace"}, {"op": "remove-trace"}], "operation 1 (remove-trace)"),
+        ([{"op": "add-trace-setup", "name": "x"}], "missing required key(s): command"),
+        ([{"name": "x"}], "operation 0: unrecognized campaign operation: None"),
+        ([{"op": ["add-trace"]}], "operation 0: unrecognized campaign operation"),
+        (
+            [{"op": "add-trace-setup", "name": "x", "command": 5}],
+            "operation 0 (add-trace-setup): command must be a string",
+        ),
+        (
+            [{"op": "add-trace-teardown", "name": "x", "command": ["rm"]}],
+            "command must be a string",
+        ),
+        ([{"op": "add-trace", "args": "abc"}], "args must be a list of strings"),
+        ([{"op": "add-trace", "args": ["a", 1]}], "args must be a list of strings"),
+        ([{"op": "add-trace", "name": 1}], "name must be a string"),
+        (
+            [{"op": "add-trace", "symbolic_indexes": [1, "2"]}],
+            "symbolic_indexes must be a list of integers",
+        ),
+        (
+            [{"op": "add-trace", "symbolic_indexes": [True]}],
+            "symbolic_indexes must be a list of integers",
+        ),
+        ([{"op": "remove-trace", "name": ["x"]}], "name must be a trace name"),
+        ([{"op": "remove-trace", "name": True}], "name must be a trace name"),
+        ([{"op": "set-trace-stdin", "name": 0, "stdin": 1}], "stdin must be a string"),
+        (
+            [{"op": "add-trace-input-file", "name": 0, "source": 1}],
+            "source must be a string",
+        ),
+        (
+            [{"op": "add-trace-input-file", "name": 0, "source": "x", "destination": 1}],
+            "destination must be a string",
+        ),
+        (
+            [{"op": "add-trace-input-file", "name": 0, "source": "x", "permissions": 7}],
+            "permissions must be a string or boolean",
+        ),
+        (
+            [{"op": "remove-trace-input-file", "name": 0, "source": None}],
+            "source must be a string",
+        ),
+    ])
+    @patch.object(project, "_load_project_cached")
+    def test_apply_campaign_operations_malformed(self, mock_load, operations, message):
+        with pytest.raises(ValueError) as err:
+            project.apply_campaign_operations("asdf", operations)
+        assert message in str(err.value)
+        mock_load.assert_not_called()
+
+    @patch.object(project, "_load_project_cached")
+    def test_apply_campaign_operations_optional_values(self, mock_load, tmp_path):
+        input_file = tmp_path / "input.txt"
+        input_file.write_text("hello")
+        c = mock_load.return_value = project.Campaign(Path("/binary"), project="asdf")
+        c.save = MagicMock()
+        project.apply_campaign_operations("asdf", [
+            {"op": "add-trace", "name": None, "args": None, "symbolic_indexes": None},
+            {
+                "op": "add-trace-input-file",
+                "name": 0,
+                "source": str(input_file),
+                "destination": None,
+                "permissions": False,
+            },
+        ])
+        assert c.traces[0].input_files == [
+            project.TraceInputFile(input_file, None, False)
+        ]
+
+    @patch.object(project, "apply_campaign_operations")
+    @patch("binrec.core.init_binrec")
+    def test_main_apply_malformed(self, mock_init, mock_apply, tmp_path, capsys):
+        ops_file = tmp_path / "ops.json"
+        for content in (
+            b'{"op": "add-trace"}',
+            b"[{",
+            b'[{"op": "remove-trace"}]',
+            b'[{"op": "remove-trace", "name": ["x"]}]',
+        ):
+            ops_file.write_bytes(content)
+            argv = ["prog", "apply", "asdf", "--ops-file", str(ops_file)]
+            with patch.object(project.sys, "argv", argv):
+                with pytest.raises(SystemExit):
+                    project.main()
+            assert "invalid campaign operations" in capsys.readouterr().err
+
+        mock_apply.assert_not_called()
+
+    @patch.object(project, "_load_project_cached")
+    def test_batch_add_trace_setup(self, mock_load):
+        c = mock_load.return_value = project.Campaign(
+            Path("/binary"),
+            project="asdf",
+            traces=[project.TraceParams(name="tr1"), project.TraceParams(name="tr2")],
+        )
+        c.save = MagicMock()
+        project.batch_add_trace_setup("asdf", [("tr1", "a"), ("tr2", "b"), (0, "c")])
+        assert c.traces[0].setup == ["a", "c"]
+        assert c.traces[1].setup == ["b"]
+        c.save.assert_called_once_with()
+
+    @patch.object(project, "_cache_saved_campaign")
+    @patch.object(project, "_load_project_cached")
+    def test_campaign_transaction(self, mock_load, mock_cache_saved):
+        c = mock_load.return_value
+        with project.campaign_transaction("asdf") as campaign:
+            assert campaign is c
+            c.save.assert_not_called()
+
+        mock_load.assert_called_once_with("asdf", resolve_input_files=False)
+        c.save.assert_called_once_with()
+        mock_cache_saved.assert_called_once_with("asdf", False, c)
+
+    @patch.object(project, "_cache_saved_campaign")
+    @patch.object(project, "_invalidate")
+    @patch.object(project, "_load_project_cached")
+    def test_campaign_transaction_save_error(
+        self, mock_load, mock_invalidate, mock_cache_saved
+    ):
+        c = mock_load.return_value
+        c.save.side_effect = OSError("disk full")
+        with pytest.raises(OSError):
+            with project.campaign_transaction("asdf"):
+                pass
+
+        mock_invalidate.assert_called_once_with("asdf")
+        mock_cache_saved.assert_not_called()
+
+    @patch.object(campaign, "project_binary_filename")
+    @patch.object(campaign, "campaign_filename")
+    @patch.object(project, "campaign_filename")
+    def test_campaign_transaction_reuses_saved(
+        self, mock_filename, mock_campaign_filename, mock_binary, tmp_path
+    ):
+        filename = tmp_path / "campaign.json"
+        filename.write_text('{"traces": [{"name": "tr1"}]}')
+        mock_filename.return_value = mock_campaign_filename.return_value = filename
+        mock_binary.return_value = Path("/binary")
+        project._campaign_cache.clear()
+
+        with patch.object(
+            project.Campaign, "load_json", wraps=project.Campaign.load_json
+        ) as mock_load_json:
+            for i in range(5):
+                project.add_trace_setup("asdf", "tr1", f"cmd{i}")
+
+        mock_load_json.assert_called_once()
+        version, cached = project._campaign_cache[("asdf", False)]
+        st = filename.stat()
+        assert version == (st.st_ino, st.st_size, st.st_mtime_ns)
+        assert cached.traces[0].setup == [f"cmd{i}" for i in range(5)]
+        assert project.Campaign.load_project(
+            "asdf", resolve_input_files=False
+        ).traces[0].setup == [f"cmd{i}" for i in range(5)]
+        project._campaign_cache.clear()
+
+    @patch.object(campaign, "project_binary_filename")
+    @patch.object(campaign, "campaign_filename")
+    @patch.object(project, "campaign_filename")
+    def test_campaign_transaction_returned_trace_detached(
+        self, mock_filename, mock_campaign_filename, mock_binary, tmp_path
+    ):
+        filename = tmp_path / "campaign.json"
+        filename.write_text('{"traces": []}')
+        mock_filename.return_value = mock_campaign_filename.return_value = filename
+        mock_binary.return_value = Path("/binary")
+        project._campaign_cache.clear()
+
+        trace = project.add_campaign_trace("asdf", ["a"], name="tr1")
+        trace.name = "renamed"
+        trace.setup.append("rm -rf stuff")
+        project.set_trace_stdin("asdf", 0, "hi")
+
+        saved = json.loads(filename.read_text())["traces"][0]
+        assert saved["name"] == "tr1"
+        assert saved["setup"] == []
+        assert saved["stdin"] == "hi"
+        project._campaign_cache.clear()
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project, "Campaign")
+    def test_load_project_cached_replaced(self, mock_campaign_cls, mock_filename, tmp_path):
+        filename = mock_filename.return_value = tmp_path / "campaign.json"
+        filename.write_text("{}")
+        project._campaign_cache.clear()
+
+        project._load_project_cached("asdf")
+        # replace the file with one that has the same size and modification time
+        st = filename.stat()
+        replacement = tmp_path / "replacement.json"
+        replacement.write_text("[]")
+        os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(replacement, filename)
+        project._load_project_cached("asdf")
+
+        assert mock_campaign_cls.load_project.call_count == 2
+        project._campaign_cache.clear()
+
+    @patch.object(project, "campaign_filename")
+    def test_cache_saved_campaign(self, mock_filename, tmp_path):
+        filename = mock_filename.return_value = tmp_path / "campaign.json"
+        filename.write_text("{}")
+        c = project.Campaign(Path("/binary"), traces=[project.TraceParams(name="a")])
+        project._campaign_cache.clear()
+        project._campaign_cache[("asdf", True)] = ((0, 0, 0), MagicMock())
+
+        project._cache_saved_campaign("asdf", False, c)
+
+        st = filename.stat()
+        version, cached = project._campaign_cache.pop(("asdf", False))
+        assert project._campaign_cache == {}
+        assert version == (st.st_ino, st.st_size, st.st_mtime_ns)
+        assert cached == c
+        assert cached is not c and cached.traces[0] is not c.traces[0]
+
+    @patch.object(project, "_invalidate")
+    @patch.object(project, "_load_project_cached")
+    def test_campaign_transaction_error(self, mock_load, mock_invalidate):
+        c = mock_load.return_value
+        with pytest.raises(KeyError):
+            with project.campaign_transaction("asdf"):
+                raise KeyError("asdf")
+
+        c.save.assert_not_called()
+        mock_invalidate.assert_called_once_with("asdf")
+
+    @patch.object(project, "campaign_transaction")
+    def test_set_trace_stdin_campaign(self, mock_transaction):
+        c = project.Campaign(Path("/binary"), traces=[project.TraceParams(name="tr1")])
+        project.set_trace_stdin("asdf", "tr1", "hello", campaign=c)
+        assert c.traces[0].stdin == "hello"
+        mock_transaction.assert_not_called()
+
+    def test_compile_output_pattern(self):
+        pattern = project._compile_output_pattern("^hello [0-9]+$")
+        assert pattern.match("hello 123")
+        assert project._compile_output_pattern("^hello [0-9]+$") is pattern
+
+    @patch.object(project, "get_trace_dirs")
+    @patch.object(project, "project_dir")
+    def test_get_next_trace_log_filename(self, mock_project_dir, mock_trace_dirs):
+        mock_project_dir.return_value = Path("/asdf")
+        mock_trace_dirs.return_value = [
+            Path("/asdf/s2e-out-0"),
+            Path("/asdf/s2e-out-2"),
+            Path("/asdf/s2e-out-x"),
+        ]
+        assert project._get_next_trace_log_filename("asdf") == Path("/asdf/s2e-out-1.log")
+
+        # a failed run does not create its trace directory, so its number is reused
+        assert project._get_next_trace_log_filename("asdf") == Path("/asdf/s2e-out-1.log")
+
+        mock_trace_dirs.return_value.append(Path("/asdf/s2e-out-1"))
+        assert project._get_next_trace_log_filename("asdf") == Path("/asdf/s2e-out-3.log")
+
+    @patch.object(project, "campaign_filename")
+    @patch.object(project.Campaign, "load_project")
+    def test_describe_campaign(self, mock_load, mock_filename, capsys):
+        mock_filename.return_value = "campaign.json"
+        mock_load.return_value = campaign.Campaign(
+            Path("bin"),
+            project="proj",
+            setup=["echo hi"],
+            traces=[
+                campaign.TraceParams(
+                    name="t1",
+                    args=[campaign.TraceArg(value="a")],
+                    input_files=[
+                        campaign.TraceInputFile(Path("in.txt"), permissions=True)
+                    ],
+                    stdin="x",
+                )
+            ],
+        )
+        project.describe_campaign("proj")
+        mock_load.assert_called_once_with("proj", resolve_input_files=False)
+        assert capsys.readouterr().out == (
+            "proj\n====\nCampaign File: campaign.json\nSample Binary: bin\n"
+            "Global Setup (1):\n  echo hi\n\nTraces (1):\n  t1\n  --\n  Id: 0\n"
+            "  Command Line Arguments: ['a']\n  Symbolic Indexes: \n"
+            "  Input Files (1):\n    in.txt\n      [Preserve source permissions]\n"
+            "  [Inherit global setup]\n  stdin:\n    x\n\n"
+        )
+
+    @patch.object(project, "merged_trace_dir")
+    @patch.object(project, "get_trace_dirs")
+    def test_clear_project_trace_data(self, mock_trace_dirs, mock_merged, tmp_path):
+        trace_dirs = [tmp_path / "s2e-out-0", tmp_path / "s2e-out-1"]
+        merged = tmp_path / "s2e-out"
+        for dirname in trace_dirs + [merged]:
+            dirname.mkdir()
+            (dirname / "file").write_text("x")
+
+        mock_trace_dirs.return_value = trace_dirs
+        mock_merged.return_value = merged
+
+        project.clear_project_trace_data("asdf")
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_remove_trace_input_file(self):
+        input_files = [
+            project.TraceInputFile(Path("/a/first.txt")),
+            project.TraceInputFile(Path("/b/second.txt")),
+            project.TraceInputFile(Path("/c/third.txt")),
+        ]
+        trace = project.TraceParams(name="tr1", input_files=list(input_files))
+        c = project.Campaign(Path("/binary"), traces=[trace])
+
+        project.remove_trace_input_file("asdf", "tr1", Path("second.txt"), campaign=c)
+        assert trace.input_files == [input_files[0], input_files[2]]
+
+        project.remove_trace_input_file("asdf", "tr1", Path("/c/third.txt"), campaign=c)
+        assert trace.input_files == [input_files[0]]
+
+        with pytest.raises(KeyError):
+            project.remove_trace_input_file("asdf", "tr1", Path("/x/first.txt"), campaign=c)